@@ -5,19 +5,22 @@ Agent anti-obsolescence Jedha — version PoC
 • Scanne tous les .ipynb du dépôt
 • Détecte les appels dépréciés listés dans DEPRECATED_MAP
 • Demande à Mistral un patch (diff unifié) pour les remplacer
-• Applique le patch sur le repo local
+• Applique le patch à la source de la cellule, en mémoire (obso_diff)
+• Réécrit chaque notebook une seule fois, avec toutes ses cellules corrigées
 """
 import os
-import subprocess
 import sys
-import re, textwrap, pathlib
 from pathlib import Path
 from typing import List, Dict
 
-import nbformat
 from langchain_mistralai import ChatMistralAI
 from langchain.schema import SystemMessage, HumanMessage
 
+# checkpoint Jupyter : les modules obso_* sont dans le dossier parent
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from obso_diff import PatchError, apply_diff  # noqa: E402
+from obso_nbio import CellSource, patch_cell_sources, read_code_cells  # noqa: E402
+
 
 # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
 # 1. CONFIGURATION GÉNÉRALE
@@ -49,10 +52,9 @@ def list_notebooks(root: Path) -> List[Path]:
     return list(root.rglob("*.ipynb"))
 
 
-def extract_code_cells(nb_path: Path) -> List[str]:
-    """Renvoie le contenu brut de chaque cellule de code d'un notebook."""
-    nb = nbformat.read(nb_path, as_version=4)
-    return [c["source"] for c in nb.cells if c.cell_type == "code"]
+def extract_code_cells(nb_path: Path) -> List[CellSource]:
+    """Renvoie (index, source) de chaque cellule de code d'un notebook."""
+    return read_code_cells(nb_path)
 
 
 def scan_cell(cell_src: str) -> List[Dict[str, str]]:
@@ -73,7 +75,7 @@ def build_prompt(file_path: str, snippet: str, issues: List[Dict[str, str]]) ->
         content=(
             "Return *only* a valid UNIX unified diff (starting with '---' and '+++'). "
             "No commentary, no Markdown, no triple backticks. "
-            "Target file path must match exactly."
+            "The diff applies to the snippet itself: line 1 is its first line."
         )
     )
 
@@ -82,7 +84,7 @@ def build_prompt(file_path: str, snippet: str, issues: List[Dict[str, str]]) ->
 
     user_msg = HumanMessage(
         content=(
-            f"File: {file_path}\n\n"
+            f"Notebook cell: {file_path}\n\n"
             f"Deprecated mapping:\n{mapping}\n\n"
             f"Problematic snippet:\n```\n{snippet}\n```\n\n"
             "Produce the patch now."
@@ -102,38 +104,13 @@ def call_llm(messages) -> str:
     return resp.content.strip()
 
 
-def apply_patch(diff_text: str) -> None:
-    """Applique un diff unifié sur le repo courant via l'outil `patch`."""
-    if not diff_text.startswith("---"):
-        print("— le diff retourné ne semble pas valide, ignoré.")
-        return
-
-    try:
-        subprocess.run(
-            ["patch", "-p1", "--forward"],
-            input=diff_text.encode(),
-            check=True,
-            capture_output=True,
-        )
-        print("✅  Patch appliqué.")
-    except subprocess.CalledProcessError as e:
-        print("⚠️  Patch non appliqué :", e.stderr.decode()[:200])
-
-def sanitize_diff(raw: str, file_rel: str) -> str:
+def patch_cell(cell_src: str, raw: str) -> str:
     """
-    • Supprime ``` diff, ``` etc.
-    • Tronque tout avant la 1ʳᵉ ligne '---'
-    • Remplace le chemin absolu par le chemin relatif attendu
+    Applique le diff du LLM à la source de la cellule (et non au JSON du
+    notebook) : blocs markdown, en-têtes et numéros de ligne approximatifs
+    sont tolérés (obso_diff). Lève PatchError si un hunk est introuvable.
     """
-    # 1) retire bloc markdown
-    cleaned = re.sub(r"```[a-z]*\s*", "", raw, flags=re.I).replace("```", "").strip()
-    # 2) garde à partir de la 1ʳᵉ '---'
-    start = cleaned.find("---")
-    cleaned = cleaned[start:] if start != -1 else cleaned
-    # 3) remplace chemin par 'a/<file_rel>' / 'b/<file_rel>'
-    cleaned = re.sub(r"--- .*?\n", f"--- a/{file_rel}\n", cleaned, count=1)
-    cleaned = re.sub(r"\+\+\+ .*?\n", f"+++ b/{file_rel}\n", cleaned, count=1)
-    return textwrap.dedent(cleaned)
+    return apply_diff(cell_src, raw)
 
 # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
 # 3. PIPELINE PRINCIPAL
@@ -142,28 +119,31 @@ def main() -> None:
     modified = False
 
     for nb_path in list_notebooks(REPO_ROOT):
-        code_cells = extract_code_cells(nb_path)
-        for cell_src in code_cells:
-            issues = scan_cell(cell_src)
+        rel_path = nb_path.relative_to(REPO_ROOT).as_posix()
+        patches: Dict[int, str] = {}
+        for cell in extract_code_cells(nb_path):
+            issues = scan_cell(cell.source)
             if not issues:
                 continue  # rien d'obsolète dans cette cellule
 
-            prompt_msgs = build_prompt(str(nb_path), cell_src, issues)
-            rel_path = nb_path.relative_to(REPO_ROOT).as_posix()
+            prompt_msgs = build_prompt(f"{rel_path}#cell{cell.index}", cell.source, issues)
             raw = call_llm(prompt_msgs)
-            diff = sanitize_diff(raw, rel_path)
-            apply_patch(diff)
             print("--------- RAW LLM OUTPUT ----------")
-            print(diff)
+            print(raw)
             print("-----------------------------------")
-            apply_patch(diff)
-
+            try:
+                fixed = patch_cell(cell.source, raw)
+            except PatchError as e:
+                print(f"⚠️  Patch non appliqué ({rel_path}, cellule {cell.index}) : {e}")
+                continue
+            if fixed != cell.source:
+                patches[cell.index] = fixed
+
+        # une seule écriture par notebook, toutes cellules confondues
+        if patches:
+            patch_cell_sources(nb_path, patches)
+            print(f"✅  {rel_path} : {len(patches)} cellule(s) corrigée(s).")
             modified = True
-            
-    if diff.startswith("---"):
-        apply_patch(diff)
-    else:
-        print("Diff vide ou mal formé, ignoré.")
 
     if modified:
         print("🎉  Des patches ont été appliqués ; committe-les !")
@@ -3,27 +3,46 @@
 
 from __future__ import annotations
 
+import argparse
 import ast
+import asyncio
+import json
 import os
 import re
 import sys
+import time
+from collections import Counter
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Tuple
 
-import nbformat 
-from langchain_mistralai import ChatMistralAI  
-from langchain.schema import SystemMessage, HumanMessage
+from obso_cache import CACHE_DIR, FixCache, make_key
+from obso_client import ResilientChat, StreamAborted
+from obso_discovery import NotebookFinder, iter_notebooks
+from obso_manifest import Manifest, head_commit
+from obso_matcher import RuleMatcher
+from obso_metrics import METRICS_JSON, METRICS_PROM, Metrics
+from obso_nbio import patch_cell_sources, read_code_cells
+from obso_signatures import learned_rules, merge_rules
+from obso_shard import (BALANCE_MODES, ShardResult, load_timings, merge_results, parse_shard,
+                        select_shard)
+from obso_slicing import lines_of_spans, slice_statements, splice
+from obso_stream import LLM_STREAM, CodeGuard, max_tokens_for, truncated
 
 # ---------------------------------------------------------------------------
 # CONFIGURATION
 # ---------------------------------------------------------------------------
 
-API_KEY = os.getenv("MISTRAL_API_KEY")
-if not API_KEY:
-    sys.exit("❌  Variable MISTRAL_API_KEY introuvable ; exporte ta clé.")
-
 REPO_ROOT = Path(os.getenv("CONTENT_REPO", ".")).resolve()
 MODEL_NAME = os.getenv("MISTRAL_MODEL", "mistral-small")
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))  # requêtes simultanées
+LLM_BATCH_TOKENS = int(os.getenv("LLM_BATCH_TOKENS", "0"))  # 0 = une requête par cellule
+# Manifeste du mode --incremental (un par dépôt de contenu)
+MANIFEST_PATH = Path(os.getenv(
+    "OBSO_MANIFEST", CACHE_DIR / f"manifest-{make_key(str(REPO_ROOT))[:12]}.json"))
+# Durées par notebook du dernier run fusionné (--shard-balance runtime)
+SHARD_TIMINGS = Path(os.getenv("OBSO_SHARD_TIMINGS", CACHE_DIR / "shard-timings.json"))
 
 # Signatures obsolètes
 DEPRECATED_MAP: Dict[str, str] = {
@@ -32,9 +51,15 @@ DEPRECATED_MAP: Dict[str, str] = {
       r"\.ravel\(": ".to_numpy(",
     r"freq=[\"']Q[\"']": "freq='QE'",
 }
-# Pré-compile 
-PATTERN_RE = re.compile("|".join(DEPRECATED_MAP.keys()), re.IGNORECASE)
+# Signatures apprises par l'agent dynamique (obso_signatures.py), ajoutées à la table
+LEARNED_MAP = learned_rules()
+RULES = merge_rules(DEPRECATED_MAP, LEARNED_MAP)
+# Pré-compile : une regex et un littéral obligatoire (préfiltre) par règle
+MATCHER = RuleMatcher(RULES)
 FREQ_RE = re.compile(r"""freq\s*=\s*['"]Q['"]""")
+# Règles réécrites localement par obso_codemods (sans LLM) → nom de la règle côté codemod
+CODEMOD_PATTERNS = {r"\.format\(": "format", r"DataFrame\.ix": "ix", r"\.ravel\(": "ravel",
+                    r"freq=[\"']Q[\"']": "freq"}
 
 def is_valid_python(code: str) -> bool:
     try:
@@ -43,94 +68,713 @@ def is_valid_python(code: str) -> bool:
     except SyntaxError:
         return False
 
+def try_codemods(src: str, hits: Dict[str, str]) -> Optional[str]:
+    """Correction déterministe ; None si le LLM doit trancher.
+
+    C'est le cas si une règle sans codemod est concernée, ou si une
+    occurrence détectée hors commentaire n'a été ni réécrite ni reconnue
+    comme faux positif (freq='q', receveur de type inconnu…).
+    """
+    if any(rule not in CODEMOD_PATTERNS for rule in hits):
+        return None
+    from obso_codemods import run_codemods, strip_comments  # libcst : inutile en --scan-only
+    result = run_codemods(src)
+    if result is None:
+        return None
+    code = strip_comments(src)
+    for rule in hits:
+        if len(re.findall(rule, code, re.IGNORECASE)) > result.sites[CODEMOD_PATTERNS[rule]]:
+            return None
+    return result.code
+
 def list_notebooks(root: Path) -> List[Path]:
-    return list(root.rglob("*.ipynb"))
+    return list(iter_notebooks(root))
 
 
 # ---------------------------------------------------------------------------
 # LLM
 # ---------------------------------------------------------------------------
 
-chat = ChatMistralAI(model=MODEL_NAME, temperature=0.0)
-SYSTEM_MSG = SystemMessage(
-    content=(
-        "You are an expert Python instructor. When given a code snippet, "
-        "return ONLY a corrected snippet, no markdown fences, no explanations."))
+# Client et messages langchain construits à la première utilisation : la
+# détection seule (--scan-only) n'importe jamais la pile LLM.
+SYSTEM_PROMPT = (
+    "You are an expert Python instructor. When given a code snippet, "
+    "return ONLY a corrected snippet, no markdown fences, no explanations.")
+BATCH_SYSTEM_PROMPT = (
+    "You are an expert Python instructor. You receive a JSON object mapping "
+    "cell ids to Python code snippets. Return ONLY a JSON object with exactly "
+    "the same keys, each mapped to the corrected snippet as a string. "
+    "No markdown fences, no explanations.")
 
+_chat = None
 
-def fix_code_snippet(snippet: str, mapping: Dict[str, str]) -> str:
-    """Envoie le code au LLM et récupère la version corrigée."""
-    human_content = (
+
+def require_api_key() -> None:
+    if not os.getenv("MISTRAL_API_KEY"):
+        sys.exit("❌  Variable MISTRAL_API_KEY introuvable ; exporte ta clé.")
+
+
+def get_chat():
+    """Client ChatMistralAI partagé, créé au premier appel.
+
+    Il est enveloppé par ResilientChat (débit, relances, concurrence
+    adaptative, disjoncteur) ; les relances internes de langchain sont
+    désactivées pour ne pas se cumuler.
+    """
+    global _chat
+    if _chat is None:
+        require_api_key()
+        from langchain_mistralai import ChatMistralAI
+        _chat = ResilientChat(ChatMistralAI(model=MODEL_NAME, temperature=0.0, max_retries=1),
+                              concurrency=LLM_CONCURRENCY, metrics=METRICS)
+    return _chat
+
+
+def build_messages(system: str, human: str) -> list:
+    from langchain.schema import HumanMessage, SystemMessage
+    return [SystemMessage(content=system), HumanMessage(content=human)]
+
+# Cache disque : une cellule inchangée (même règles, prompt, modèle) ne repart pas au LLM
+CACHE = FixCache()
+# Latences par étape et compteurs du run, exportés à la fin de main()
+METRICS = Metrics("static")
+
+
+def _build_prompt(snippet: str, mapping: Dict[str, str]) -> str:
+    return (
         "Code to fix:\n" + snippet + "\n\n" +
         "Replace any deprecated pattern according to this table (if present):\n" +
         "\n".join([f"- {k} → {v}" for k, v in mapping.items()]))
-    resp = chat.invoke([SYSTEM_MSG, HumanMessage(content=human_content)])
-    return resp.content.strip()
 
-def safe_fix(snippet: str) -> str:
-    """Appelle le LLM, vérifie la syntaxe, fallback regex si besoin."""
-    fixed = fix_code_snippet(snippet, DEPRECATED_MAP)
+
+def _cache_key(snippet: str, mapping: Dict[str, str]) -> str:
+    return make_key(MODEL_NAME, SYSTEM_PROMPT, _build_prompt(snippet, mapping))
+
+
+def _aborted(exc: StreamAborted, prompt_chars: int) -> None:
+    METRICS.inc("llm_aborted_total", reason=exc.reason)
+    METRICS.count_usage(SimpleNamespace(content=exc.text), prompt_chars)
+
+
+def _checked(resp, prompt_chars: int, max_tokens: int):
+    METRICS.count_usage(resp, prompt_chars)
+    if truncated(resp, max_tokens):  # coupée à max_tokens : le code rendu serait incomplet
+        METRICS.inc("llm_aborted_total", reason="truncated")
+        raise StreamAborted("truncated", resp.content)
+    return resp
+
+
+def _invoke(system: str, human: str, source: Optional[str] = None):
+    """Appel LLM chronométré (étape « llm ») et compté : requêtes, erreurs, tokens.
+
+    La sortie est plafonnée en proportion de l'entrée (`source`, le code à
+    réécrire, à défaut tout le prompt). Avec `source` et LLM_STREAM, la
+    réponse est lue en flux sous CodeGuard : StreamAborted dès qu'elle
+    dérive (fence, prose, réécriture), sans attendre la fin.
+    """
+    METRICS.inc("llm_requests_total")
+    messages = build_messages(system, human)
+    max_tokens = max_tokens_for(source if source is not None else human)
+    try:
+        with METRICS.stage("llm"):
+            if LLM_STREAM and source is not None:
+                resp = get_chat().stream(messages, check=CodeGuard(source).check,
+                                         max_tokens=max_tokens)
+            else:
+                resp = get_chat().invoke(messages, max_tokens=max_tokens)
+    except StreamAborted as exc:
+        _aborted(exc, len(system) + len(human))
+        raise
+    except Exception:
+        METRICS.inc("llm_errors_total")
+        raise
+    return _checked(resp, len(system) + len(human), max_tokens)
+
+
+async def _ainvoke(system: str, human: str, source: Optional[str] = None):
+    """Version asynchrone de _invoke."""
+    METRICS.inc("llm_requests_total")
+    messages = build_messages(system, human)
+    max_tokens = max_tokens_for(source if source is not None else human)
+    try:
+        with METRICS.stage("llm"):
+            if LLM_STREAM and source is not None:
+                resp = await get_chat().astream(messages, check=CodeGuard(source).check,
+                                                max_tokens=max_tokens)
+            else:
+                resp = await get_chat().ainvoke(messages, max_tokens=max_tokens)
+    except StreamAborted as exc:
+        _aborted(exc, len(system) + len(human))
+        raise
+    except Exception:
+        METRICS.inc("llm_errors_total")
+        raise
+    return _checked(resp, len(system) + len(human), max_tokens)
+
+
+def fix_code_snippet(snippet: str, mapping: Dict[str, str]) -> str:
+    """Envoie le code au LLM et récupère la version corrigée."""
+    human_content = _build_prompt(snippet, mapping)
+    key = _cache_key(snippet, mapping)
+    cached = CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    resp = _invoke(SYSTEM_PROMPT, human_content, snippet)
+    fixed = resp.content.strip()
+    if is_valid_python(fixed):  # une réponse invalide n'est pas resservie
+        CACHE.put(key, fixed)
+    return fixed
+
+
+async def afix_code_snippet(snippet: str, mapping: Dict[str, str], lookup: bool = True) -> str:
+    """Version asynchrone de fix_code_snippet (ainvoke).
+
+    `lookup=False` : l'appelant a déjà consulté le cache (échec), on ne le
+    relit pas pour ne pas compter deux fois le même miss.
+    """
+    human_content = _build_prompt(snippet, mapping)
+    key = _cache_key(snippet, mapping)
+    cached = CACHE.get(key) if lookup else None
+    if cached is not None:
+        return cached
+
+    resp = await _ainvoke(SYSTEM_PROMPT, human_content, snippet)
+    fixed = resp.content.strip()
+    if is_valid_python(fixed):  # une réponse invalide n'est pas resservie
+        CACHE.put(key, fixed)
+    return fixed
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière (≈ 4 caractères par token) pour les budgets."""
+    return len(text) // 4 + 1
+
+
+class DirectProposer:
+    """Une requête par cellule, LLM_CONCURRENCY requêtes simultanées."""
+
+    def __init__(self, sem: asyncio.Semaphore):
+        self.sem = sem
+
+    async def propose(self, snippet: str, mapping: Dict[str, str], lookup: bool = True) -> str:
+        async with self.sem:
+            return await afix_code_snippet(snippet, mapping, lookup)
+
+
+class BatchProposer(DirectProposer):
+    """Regroupe les cellules dans une requête JSON {id: code} sous un budget de tokens.
+
+    Un lot part dès que le budget est atteint, ou après `linger` secondes sans
+    nouvelle cellule. Les cellules absentes de la réponse ou dont le code ne
+    se parse pas sont renvoyées une à une, toutes si la réponse est tronquée
+    ou n'est pas du JSON lisible. Seule une indisponibilité du LLM est
+    propagée aux cellules du lot.
+    """
+
+    def __init__(self, sem: asyncio.Semaphore, budget_tokens: int, linger: float = 0.05):
+        super().__init__(sem)
+        self.budget = budget_tokens
+        self.linger = linger
+        self._pending: List[Tuple[str, Dict[str, str], asyncio.Future]] = []
+        self._tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def propose(self, snippet: str, mapping: Dict[str, str]) -> str:
+        cached = CACHE.get(_cache_key(snippet, mapping))
+        if cached is not None:
+            return cached
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        cost = estimate_tokens(snippet)
+        if self._pending and self._tokens + cost > self.budget:
+            self._flush()
+        self._pending.append((snippet, mapping, fut))
+        self._tokens += cost
+        if self._tokens >= self.budget:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._tokens = self._pending, [], 0
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)  # garde une référence jusqu'à la fin
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, Dict[str, str], asyncio.Future]]) -> None:
+        if len(batch) == 1:
+            snippet, mapping, fut = batch[0]
+            await self._resolve(fut, super().propose(snippet, mapping, lookup=False))
+            return
+
+        cells = {f"c{i}": snippet for i, (snippet, _, _) in enumerate(batch)}
+        rules: Dict[str, str] = {}
+        for _, mapping, _ in batch:
+            rules.update(mapping)
+        human_content = (
+            "Replace any deprecated pattern according to this table (if present):\n" +
+            "\n".join([f"- {k} → {v}" for k, v in rules.items()]) +
+            "\n\nCells (JSON):\n" + json.dumps(cells, ensure_ascii=False))
+        try:
+            async with self.sem:
+                resp = await _ainvoke(BATCH_SYSTEM_PROMPT, human_content)
+        except StreamAborted:
+            answers = {}  # réponse tronquée : chaque cellule est renvoyée seule
+        except Exception as exc:  # LLM indisponible (disjoncteur, relances épuisées)
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+        else:
+            try:
+                answers = _parse_json_object(resp.content)
+            except ValueError:
+                answers = {}  # JSON illisible : idem
+
+        retries = []
+        for i, (snippet, mapping, fut) in enumerate(batch):
+            fixed = answers.get(f"c{i}")
+            if isinstance(fixed, str) and is_valid_python(fixed.strip()):
+                fixed = fixed.strip()
+                CACHE.put(_cache_key(snippet, mapping), fixed)
+                fut.set_result(fixed)
+            else:
+                METRICS.inc("llm_retries_total")
+                retries.append(self._resolve(fut, super().propose(snippet, mapping, lookup=False)))
+        await asyncio.gather(*retries)
+
+    @staticmethod
+    async def _resolve(fut: asyncio.Future, coro) -> None:
+        try:
+            fut.set_result(await coro)
+        except Exception as exc:
+            fut.set_exception(exc)
+
+
+def _parse_json_object(text: str) -> Dict[str, object]:
+    """Décode la réponse JSON du LLM (tolère des fences markdown autour)."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("réponse JSON inattendue (objet attendu)")
+    return data
+
+
+def _validate_or_fallback(snippet: str, fixed: str) -> Tuple[str, str]:
+    """Renvoie (code retenu, étape qui l'a produit)."""
     if is_valid_python(fixed):
-        return fixed
+        return fixed, "llm"
+    return _fallback(snippet)
+
 
+def _fallback(snippet: str) -> Tuple[str, str]:
+    """Sans proposition LLM utilisable : regex, puis code original."""
     # Fallback 1 : simple regex sur freq='Q'
     regex_fixed = FREQ_RE.sub("freq='QE'", snippet)
     if is_valid_python(regex_fixed):
-        return regex_fixed
+        return regex_fixed, "regex"
 
     # Fallback 2 : retourner le code original
     print("⚠️  Impossible de corriger automatiquement la cellule.")
-    return snippet
-    
+    return snippet, "original"
+
+
+def safe_fix(snippet: str) -> str:
+    """Appelle le LLM, vérifie la syntaxe, fallback regex si besoin."""
+    mapping = MATCHER.rules_hit(snippet) or RULES
+    try:
+        fixed = fix_code_snippet(snippet, mapping)
+    except StreamAborted:
+        return _fallback(snippet)[0]
+    return _validate_or_fallback(snippet, fixed)[0]
+
 # ---------------------------------------------------------------------------
 # PIPELINE PRINCIPAL
 # ---------------------------------------------------------------------------
+#  détection (MATCHER) → codemod → proposition LLM (1 requête, découpée
+#  aux instructions fautives)
+#  → validation (ast) → fallback (regex, puis code original)
+
+@dataclass
+class CellOutcome:
+    """Résultat du pipeline pour une cellule signalée."""
+    stage: str                      # codemod | llm | regex | original | llm-error
+    code: str                       # code retenu pour la cellule
+    proposal: Optional[str] = None  # réponse brute du LLM, s'il a été appelé
+
+
+# Nombre de cellules par étape finale, affiché en fin de run
+STAGE_STATS: Counter = Counter()
+
+
+async def propose_sliced(src: str, hits: Dict[str, str], proposer: DirectProposer) -> str:
+    """N'envoie au LLM que les instructions qui contiennent une règle.
+
+    Les morceaux corrigés sont recollés à leur place ; si le résultat ne se
+    parse pas (ou si la cellule ne se découpe pas), la cellule entière part.
+    """
+    slices = slice_statements(src, lines_of_spans(src, [(m.start, m.end) for m in MATCHER.scan(src)]))
+    if slices:
+        fixes = await asyncio.gather(*(
+            proposer.propose(sl.code, MATCHER.rules_hit(sl.code) or hits) for sl in slices))
+        candidate = splice(src, slices, fixes)
+        if is_valid_python(candidate):
+            return candidate
+    return await proposer.propose(src, hits)
+
+
+async def fix_cell(nb_path: Path, src: str, proposer: DirectProposer) -> CellOutcome:
+    """Fait passer une cellule détectée par les étapes du pipeline.
+
+    Seules les règles effectivement rencontrées dans la cellule, et les
+    instructions qui les contiennent, sont envoyées au LLM.
+    """
+    hits = MATCHER.rules_hit(src)
+    with METRICS.stage("codemod"):
+        local = try_codemods(src, hits)
+    if local is not None:
+        return CellOutcome("codemod", local)
+
+    try:
+        proposal = await propose_sliced(src, hits, proposer)
+    except StreamAborted as e:
+        # réponse interrompue en cours de flux : directement aux fallbacks
+        print(f"✂️  LLM answer aborted on {nb_path.name}: {e.reason}")
+        with METRICS.stage("validate"):
+            code, stage = _fallback(src)
+        return CellOutcome(stage, code)
+    except Exception as e:
+        # LLM indisponible (relances épuisées, disjoncteur ouvert) : fallback
+        # déterministe, et la cellule reste à retenter au prochain run
+        print(f"⚠️  LLM failure on {nb_path.name}: {e}")
+        regex_fixed = FREQ_RE.sub("freq='QE'", src)
+        return CellOutcome("llm-error", regex_fixed if is_valid_python(regex_fixed) else src)
+
+    with METRICS.stage("validate"):
+        code, stage = _validate_or_fallback(src, proposal)
+    return CellOutcome(stage, code, proposal)
+
+
+def normalize_source(src: str) -> str:
+    """Forme canonique d'une cellule : fins de ligne, espaces finaux, lignes vides autour."""
+    lines = [line.rstrip() for line in src.replace("\r\n", "\n").split("\n")]
+    return "\n".join(lines).strip("\n")
+
+
+def rules_version() -> str:
+    """Empreinte des règles : si elle change, le mode incrémental rescanne tout."""
+    return make_key(MODEL_NAME, SYSTEM_PROMPT,
+                    repr(sorted(RULES.items())), repr(sorted(CODEMOD_PATTERNS)))
+
+
+async def process_notebooks(nb_paths: Iterable[Path],
+                            manifest: Optional[Manifest] = None,
+                            batch_tokens: int = LLM_BATCH_TOKENS,
+                            shard_result: Optional[ShardResult] = None) -> List[Path]:
+    """Corrige tous les notebooks en parallèle (LLM_CONCURRENCY requêtes max).
+
+    Les requêtes partent dès qu'un notebook est lu, pendant que `nb_paths`
+    (éventuellement un générateur) continue de produire ; chaque notebook est
+    ensuite réécrit une seule fois, cellules dans l'ordre. Une cellule recopiée
+    dans plusieurs notebooks (même source normalisée) n'est corrigée qu'une
+    fois, et le résultat est reporté partout. Avec un manifeste, les cellules
+    déjà traitées sont ignorées et l'état final de chaque notebook y est
+    enregistré. Avec `batch_tokens`, les cellules sont envoyées par lots (voir
+    BatchProposer). Avec `shard_result`, les cellules corrigées et la durée de
+    chaque notebook y sont consignées (résultat partiel d'un shard). Retourne
+    la liste des notebooks modifiés.
+    """
+    sem = asyncio.Semaphore(LLM_CONCURRENCY)
+    proposer = BatchProposer(sem, batch_tokens) if batch_tokens > 0 else DirectProposer(sem)
+    loaded = []
+    unique: Dict[str, asyncio.Task] = {}  # source normalisée → correction en cours
+    started: Dict[Path, float] = {}
+    finished: Dict[Path, float] = {}
+    flagged_total = 0
+    paths = iter(nb_paths)
+    # la découverte peut être paresseuse : on la consomme hors de la boucle
+    # d'événements pour que les requêtes déjà lancées avancent pendant ce temps
+    while (nb_path := await asyncio.to_thread(_next_path, paths)) is not None:
+        # lecture rapide (sources seules), réécriture limitée aux cellules modifiées
+        started[nb_path] = time.perf_counter()
+        with METRICS.stage("read"):
+            cells = read_code_cells(nb_path)
+        METRICS.inc("notebooks_total", result="read")
+        with METRICS.stage("match"):
+            flagged = [cell for cell in cells if MATCHER.search(cell.source)]
+        jobs = []
+        for cell in flagged:
+            if manifest and manifest.is_known_cell(nb_path, cell.source):
+                continue
+            flagged_total += 1
+            key = normalize_source(cell.source)
+            task = unique.get(key)
+            if task is None:
+                task = unique[key] = asyncio.create_task(fix_cell(nb_path, cell.source, proposer))
+            else:
+                METRICS.inc("cells_deduplicated_total")
+            jobs.append((cell.index, task))
+        loaded.append((nb_path, cells, jobs))
+        asyncio.gather(*(task for _, task in jobs)).add_done_callback(
+            lambda _, p=nb_path: finished.__setitem__(p, time.perf_counter()))
+
+    await asyncio.gather(*unique.values())
+    if flagged_total > len(unique):
+        print(f"🧬  {flagged_total} cellules signalées, {len(unique)} uniques : "
+              f"{flagged_total - len(unique)} copies corrigées sans nouvel appel.")
+
+    modified = []
+    for nb_path, cells, jobs in loaded:
+        sources = {cell.index: cell.source for cell in cells}
+        patched: Dict[int, str] = {}
+        retry = set()  # cellules à retenter au prochain run (échec LLM)
+        for index, task in jobs:
+            outcome: CellOutcome = task.result()
+            STAGE_STATS[outcome.stage] += 1
+            METRICS.inc("cells_total", stage=outcome.stage)
+            if outcome.stage == "llm-error":
+                retry.add(index)
+            src = sources[index]
+            # la correction vient peut-être d'une copie : inchangée si elle ne
+            # diffère de cette cellule que par des espaces
+            if normalize_source(outcome.code) != normalize_source(src):
+                patched[index] = sources[index] = outcome.code
+                print(f"→ Patched cell in {nb_path.name} "
+                      f"(len {len(src)} -> {len(outcome.code)}, {outcome.stage})")
+
+        if patched:
+            with METRICS.stage("write"):
+                patch_cell_sources(nb_path, patched)
+            METRICS.inc("notebooks_total", result="patched")
+            modified.append(nb_path)
+        if shard_result is not None:
+            shard_result.record(nb_path, {cell.index: cell.source for cell in cells}, patched,
+                                finished.get(nb_path, time.perf_counter()) - started[nb_path])
+        if manifest is not None:
+            manifest.record(nb_path, [src for i, src in sources.items() if i not in retry],
+                            retry=bool(retry), patched=bool(patched))
+    return modified
+
+
+def _next_path(paths):
+    """Prochain notebook de la découverte (étape « discovery »), None à la fin."""
+    with METRICS.stage("discovery"):
+        return next(paths, None)
+
 
 def process_notebook(nb_path: Path) -> bool:
     """Modifie le notebook en place. Retourne True s'il y a eu un changement."""
-    nb = nbformat.read(nb_path, as_version=4)
-    changed = False
+    return bool(asyncio.run(process_notebooks([nb_path])))
 
-    for cell in nb.cells:
-        if cell.cell_type != "code":
-            continue
-        src: str = cell["source"]
-        if not PATTERN_RE.search(src):
-            continue  
 
-        try:
-            fixed = fix_code_snippet(src, DEPRECATED_MAP)
-        except Exception as e:
-            print(f"⚠️  LLM failure on {nb_path.name}: {e}")
-            continue
-            
-        if fixed and fixed != src:
-            cell["source"] = fixed
-            
-        new_code = safe_fix(src)
-        if new_code != src:
-            cell["source"] = new_code
-            changed = True
-            print(f"→ Patched cell in {nb_path.name} (len {len(src)} -> {len(fixed)})")
-
-    if changed:
-        nbformat.write(nb, nb_path)
-    return changed
-
-
-def main() -> None:
-    modified_files = []
-    for nb in list_notebooks(REPO_ROOT):
-        if process_notebook(nb):
-            modified_files.append(nb.relative_to(REPO_ROOT))
+def _shard_arg(text: str):
+    try:
+        return parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Agent anti-obsolescence (scan statique).")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="ne traiter que les notebooks/cellules modifiés depuis le dernier run "
+             "(git diff + manifeste de hash, scan complet si les règles changent)")
+    parser.add_argument(
+        "--include", action="append", metavar="GLOB",
+        help="ne garder que les notebooks dont le chemin relatif matche (répétable, "
+             "défaut : $OBSO_INCLUDE)")
+    parser.add_argument(
+        "--exclude", action="append", metavar="GLOB",
+        help="ignorer les notebooks dont le chemin relatif matche (répétable, "
+             "défaut : $OBSO_EXCLUDE)")
+    parser.add_argument(
+        "--batch-tokens", type=int, default=LLM_BATCH_TOKENS, metavar="N",
+        help="regrouper plusieurs cellules par requête LLM jusqu'à ~N tokens de code "
+             "(0 = une requête par cellule, défaut : $LLM_BATCH_TOKENS)")
+    parser.add_argument(
+        "--scan-only", action="store_true",
+        help="détection seule (aucun appel LLM, langchain non importé) : rapport JSON "
+             "des motifs trouvés (code de sortie 0, voir --fail-on-findings)")
+    parser.add_argument(
+        "--fail-on-findings", action="store_true",
+        help="avec --scan-only : code de sortie 1 s'il y a des motifs (gate bloquante)")
+    parser.add_argument(
+        "--report", default="-", metavar="PATH",
+        help="fichier du rapport JSON de --scan-only (défaut : sortie standard)")
+    parser.add_argument(
+        "--metrics-json", default=METRICS_JSON, metavar="PATH",
+        help="rapport JSON du run : latences par étape, tokens, cache, relances "
+             "(défaut : $OBSO_METRICS_JSON, chaîne vide = désactivé)")
+    parser.add_argument(
+        "--metrics-prom", default=METRICS_PROM, metavar="PATH",
+        help="mêmes métriques au format textfile Prometheus "
+             "(défaut : $OBSO_METRICS_PROM, chaîne vide = désactivé)")
+    parser.add_argument(
+        "--shard", type=_shard_arg, metavar="I/N",
+        help="ne traiter que le shard I (1..N) des notebooks, répartis par hash stable du "
+             "chemin ; écrit un résultat partiel (voir --shard-out, --merge)")
+    parser.add_argument(
+        "--shard-balance", choices=BALANCE_MODES, default="hash",
+        help="répartition : hash du chemin (défaut, au fil de l'eau), taille des fichiers, "
+             "ou durée du dernier run fusionné ($OBSO_SHARD_TIMINGS)")
+    parser.add_argument(
+        "--shard-out", metavar="PATH",
+        help="fichier du résultat partiel (défaut : <cache>/shard-I-of-N.json)")
+    parser.add_argument(
+        "--merge", nargs="+", metavar="PART",
+        help="appliquer au dépôt les résultats partiels de tous les shards, puis quitter")
+    return parser.parse_args(argv)
+
+
+def merge_shards(parts: List[str]) -> None:
+    """Fusionne les résultats partiels dans le dépôt (job final de la matrice CI)."""
+    report = merge_results(REPO_ROOT, [Path(p) for p in parts])
+    # un run incrémental ne mesure que les notebooks repris : on garde les autres
+    timings = load_timings(SHARD_TIMINGS)
+    timings.update(report.timings)
+    SHARD_TIMINGS.parent.mkdir(parents=True, exist_ok=True)
+    SHARD_TIMINGS.write_text(json.dumps(timings, indent=1, sort_keys=True) + "\n",
+                             encoding="utf-8")
+    if report.modified:
+        print(f"\n🎉  Notebooks mis à jour ({len(parts)} shard(s)) :")
+        for rel in report.modified:
+            print(f" • {rel}")
+    else:
+        print("👍  Aucune mise à jour nécessaire.")
+    print("🧭  Étapes : " + (", ".join(f"{k} {v}" for k, v in sorted(report.stages.items())) or "—"))
+    if report.conflicts:
+        for rel, index in report.conflicts:
+            print(f"⚠️  Conflit : cellule {index} de {rel} modifiée depuis le passage du shard.")
+        sys.exit(1)
+
+
+def scan_notebooks(nb_paths: Iterable[Path]) -> Dict[str, object]:
+    """Rapport de détection : une entrée par occurrence de règle."""
+    findings = []
+    scanned = 0
+    paths = iter(nb_paths)
+    while (nb_path := _next_path(paths)) is not None:
+        scanned += 1
+        with METRICS.stage("read"):
+            cells = read_code_cells(nb_path)
+        METRICS.inc("notebooks_total", result="read")
+        for cell in cells:
+            src = cell.source
+            with METRICS.stage("match"):
+                matches = MATCHER.scan(src)
+            for m in matches:
+                line_start = src.rfind("\n", 0, m.start) + 1
+                findings.append({
+                    "notebook": nb_path.relative_to(REPO_ROOT).as_posix(),
+                    "cell": cell.index,
+                    "line": src.count("\n", 0, m.start) + 1,
+                    "column": m.start - line_start + 1,
+                    "rule": m.rule,
+                    "suggestion": RULES[m.rule],
+                    "learned": m.rule not in DEPRECATED_MAP,
+                    "match": src[m.start:m.end],
+                })
+    return {"root": str(REPO_ROOT), "notebooks_scanned": scanned,
+            "findings_count": len(findings), "findings": findings}
+
+
+def export_metrics(args: argparse.Namespace, log) -> None:
+    """Écrit le rapport de métriques du run et en affiche le résumé."""
+    METRICS.inc("cache_lookups_total", CACHE.hits, result="hit")
+    METRICS.inc("cache_lookups_total", CACHE.misses, result="miss")
+    print(f"⏱️  Étapes (temps cumulé) : {METRICS.summary()}", file=log)
+    try:
+        written = METRICS.export(args.metrics_json, args.metrics_prom)
+    except OSError as e:
+        print(f"⚠️  Métriques non écrites : {e}", file=log)
+        return
+    if written:
+        print("📈  Métriques : " + ", ".join(str(p) for p in written), file=log)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.merge:
+        merge_shards(args.merge)
+        return
+    # en --scan-only, la sortie standard est réservée au rapport JSON
+    log = sys.stderr if args.scan_only else sys.stdout
+    finder = NotebookFinder(REPO_ROOT, include=args.include, exclude=args.exclude)
+    learned = [rule for rule in RULES if rule not in DEPRECATED_MAP]
+    if learned:
+        print(f"📚  {len(learned)} signature(s) apprise(s) à l'exécution ajoutée(s) aux règles.",
+              file=log)
+    manifest = None
+    targets: Optional[Iterable[Path]] = None
+    if args.incremental:
+        manifest = Manifest(MANIFEST_PATH, REPO_ROOT, rules_version())
+        changed = manifest.changed_notebooks()
+        if changed is None:
+            print("🔁  Mode incrémental : pas de référence exploitable, scan complet.", file=log)
+        else:
+            targets = [p for p in changed if finder.accepts(p)]
+            pending = set(manifest.pending_retry())
+            retried = sum(p.relative_to(REPO_ROOT).as_posix() in pending for p in targets)
+            print(f"🔁  Mode incrémental : {len(targets)} notebook(s) modifié(s) "
+                  f"depuis {manifest.commit[:8]}"
+                  + (f", dont {retried} à reprendre (échec LLM ou correction non fusionnée)."
+                     if retried else "."),
+                  file=log)
+    if targets is None:
+        targets = iter(finder)
+    shard_result = None
+    if args.shard:
+        targets = select_shard(targets, REPO_ROOT, args.shard, args.shard_balance,
+                               load_timings(SHARD_TIMINGS))
+        shard_result = ShardResult(REPO_ROOT, args.shard)
+        print(f"🧩  Shard {args.shard} (répartition : {args.shard_balance}).", file=log)
+
+    if args.scan_only:
+        report = scan_notebooks(targets)
+        payload = json.dumps(report, indent=2, ensure_ascii=False)
+        if args.report == "-":
+            print(payload)
+        else:
+            Path(args.report).write_text(payload + "\n", encoding="utf-8")
+        print(f"🔎  {report['findings_count']} motif(s) obsolète(s) dans "
+              f"{report['notebooks_scanned']} notebook(s).", file=log)
+        export_metrics(args, log)
+        if args.fail_on_findings and report["findings_count"]:
+            sys.exit(1)
+        return
+
+    require_api_key()
+    modified = asyncio.run(process_notebooks(targets, manifest, args.batch_tokens, shard_result))
+    if manifest is not None:
+        manifest.save(head_commit(REPO_ROOT))
+    if shard_result is not None:
+        shard_result.stages = dict(STAGE_STATS)
+        out = Path(args.shard_out or CACHE_DIR / f"shard-{args.shard.index}-of-{args.shard.count}.json")
+        shard_result.save(out)
+        print(f"🧩  Résultat partiel : {out}")
+    modified_files = [nb.relative_to(REPO_ROOT) for nb in modified]
 
     if modified_files:
-        print("\n🎉  Notebooks mis à jour :")
+        print("\n🎉  Notebooks mis à jour :")
         for p in modified_files:
             print(f" • {p}")
         print("\n📝  Pense à git add / commit avant push.")
     else:
         print("👍  Aucune mise à jour nécessaire.")
+    print("🧭  Étapes : " + (", ".join(f"{k} {v}" for k, v in sorted(STAGE_STATS.items())) or "—"))
+    print(f"💾  Cache LLM : {CACHE.summary()}")
+    export_metrics(args, log)
 
 
 if __name__ == "__main__":
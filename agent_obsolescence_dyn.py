@@ -3,23 +3,40 @@
 
 from __future__ import annotations
 
+import asyncio
+import json
 import os
 import sys
-import warnings
 import ast
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
 
 import nbformat
 from nbclient import NotebookClient
 from langchain_mistralai import ChatMistralAI
 from langchain.schema import SystemMessage, HumanMessage
 
+from obso_cache import CACHE_DIR, FixCache, make_key
+from obso_client import ResilientChat, StreamAborted
+from obso_discovery import iter_notebooks
+from obso_kernel import KernelWarning, collect, execution_key, instrument
+from obso_kernel_pool import get_pool
+from obso_metrics import Metrics
+from obso_nbio import patch_cell_sources, read_code_cells
+from obso_signatures import SignatureDB
+from obso_slicing import slice_statements, splice
+from obso_stream import LLM_STREAM, CodeGuard, max_tokens_for, truncated
+from obso_verify import verify_fixes
+
 # ---------------------------------------------------------------------------
 # CONFIGURATION GLOBALE
 # ---------------------------------------------------------------------------
 
 os.environ.setdefault("PYTHONWARNINGS", "always")
+DEPRECATION_CATEGORIES = {"DeprecationWarning", "PendingDeprecationWarning", "FutureWarning"}
 
 API_KEY = os.getenv("MISTRAL_API_KEY")
 if not API_KEY:
@@ -28,41 +45,167 @@ if not API_KEY:
 REPO_ROOT = Path(os.getenv("CONTENT_REPO", ".")).resolve()
 MODEL_NAME = os.getenv("MISTRAL_MODEL", "mistral-small")
 EXEC_TIMEOUT = int(os.getenv("EXEC_TIMEOUT", "120"))  # sec/notebook
+EXEC_WORKERS = int(os.getenv("EXEC_WORKERS", "0")) or os.cpu_count() or 1  # notebooks en parallèle
+EXEC_CACHE = os.getenv("EXEC_CACHE", "1") != "0"  # réutiliser les warnings d'un notebook inchangé
+EXEC_CACHE_MB = int(os.getenv("EXEC_CACHE_MB", "16"))
+KERNEL_POOL = os.getenv("KERNEL_POOL", "1") != "0"  # kernels chauds réutilisés (obso_kernel_pool)
+VERIFY_FIXES = os.getenv("VERIFY_FIXES", "1") != "0"  # rejouer les cellules corrigées (obso_verify)
 
-chat = ChatMistralAI(model=MODEL_NAME, temperature=0.0)
 SYS_MSG = SystemMessage(
     content=(
         "You are an expert Python mentor. Given a warning message and the exact "
         "code that triggers it, return ONLY the fixed code. No markdown, no extra words."))
 
+# Même cache disque que l'agent statique (clés distinctes : le prompt diffère)
+CACHE = FixCache()
+# Warnings par exécution, adressés par code + kernel + environnement (obso_kernel.execution_key)
+EXEC_RESULTS = FixCache(CACHE_DIR / "exec", EXEC_CACHE_MB * 1024 * 1024)
+# Signatures des warnings observés, réutilisées comme règles par l'agent statique
+SIGNATURES = SignatureDB()
+# Latences par étape et compteurs, exportés en fin de run (OBSO_METRICS_JSON / _PROM)
+METRICS = Metrics("dyn")
+# Débit, relances avec backoff, disjoncteur (obso_client.py) ; langchain ne relance pas
+chat = ResilientChat(ChatMistralAI(model=MODEL_NAME, temperature=0.0, max_retries=1),
+                     concurrency=1, metrics=METRICS)
+
 # ---------------------------------------------------------------------------
 # FONCTIONS UTILES
 # ---------------------------------------------------------------------------
 
-def execute_and_collect(nb_path: Path) -> List[warnings.WarningMessage]:
-    """Exécute un notebook et renvoie la liste des warnings capturés."""
+def _run_instrumented(nb: nbformat.NotebookNode) -> None:
+    """Exécute en place un notebook instrumenté (kernel chaud ou NotebookClient)."""
+    if KERNEL_POOL:
+        get_pool().execute(nb, EXEC_TIMEOUT)
+    else:
+        client = NotebookClient(nb, timeout=EXEC_TIMEOUT, allow_errors=True)
+        asyncio.run(asyncio.wait_for(client.async_execute(), EXEC_TIMEOUT))
+
+
+def _execute(nb_path: Path):
+    """Exécute un notebook ; renvoie (warnings, clé d'exécution, exécution complète).
+
+    Le dernier élément vaut None quand les warnings viennent du cache.
+    """
     nb = nbformat.read(nb_path, as_version=4)
-    with warnings.catch_warnings(record=True) as w:
-        warnings.filterwarnings("always", category=FutureWarning)
-        warnings.filterwarnings("always", category=DeprecationWarning)
-        try:
-            NotebookClient(nb, timeout=EXEC_TIMEOUT, allow_errors=True).execute()
-        except Exception as exc:
-            print(f"⚠️  Execution error in {nb_path.name}: {exc}")
-        return list(w)
+    key = execution_key(nb)
+    if EXEC_CACHE:
+        cached = EXEC_RESULTS.get(key)
+        if cached is not None:
+            return [KernelWarning(*w) for w in json.loads(cached)], key, None
+
+    nb = instrument(nb)
+    complete = False
+    try:
+        _run_instrumented(nb)
+        complete = True
+    except asyncio.TimeoutError:
+        print(f"⚠️  Execution timeout ({EXEC_TIMEOUT}s) in {nb_path.name}")
+    except Exception as exc:
+        print(f"⚠️  Execution error in {nb_path.name}: {exc}")
+    found = collect(nb)
+    if EXEC_CACHE and complete:  # un run interrompu ne fait pas référence
+        EXEC_RESULTS.put(key, json.dumps([list(w) for w in found]))
+    return found, key, complete
+
+
+def execute_and_collect(nb_path: Path) -> List[KernelWarning]:
+    """Exécute un notebook et renvoie les warnings émis dans le kernel.
 
+    Un enregistreur injecté au démarrage du kernel attribue chaque warning à
+    sa cellule et à sa ligne. EXEC_TIMEOUT borne chaque cellule et le
+    notebook entier ; le kernel est arrêté si le délai global est dépassé.
+    Si le code des cellules, le kernel et les paquets installés n'ont pas
+    changé depuis une exécution complète, ses warnings sont réutilisés sans
+    démarrer de kernel. Avec KERNEL_POOL, chaque processus garde un kernel
+    préchauffé, remis à zéro entre deux notebooks.
+    """
+    return _execute(nb_path)[0]
 
-def code_needs_fix(code: str, warn_msg: str) -> bool:
-    """Heuristique : au moins un token du warning présent dans la cellule."""
-    tokens = [t.strip("',.()[]\n ") for t in warn_msg.split() if len(t) > 3]
-    return any(tok in code for tok in tokens)
+
+def _execute_timed(nb_path: Path):
+    """_execute + durée, mesurée dans le processus qui exécute."""
+    start = time.perf_counter()
+    found, _, complete = _execute(nb_path)
+    return found, complete is None, time.perf_counter() - start
+
+
+def _record_execution(nb_path: Path, cached: bool, seconds: float) -> None:
+    if cached:
+        METRICS.inc("exec_cache_total", result="hit")
+        print(f"♻️  {nb_path.name}: unchanged since last run, cached warnings reused")
+    else:
+        METRICS.inc("exec_cache_total", result="miss")
+        METRICS.observe("execute", seconds)
+
+
+def execute_all(nb_paths: Iterable[Path],
+                workers: int = EXEC_WORKERS) -> Dict[Path, List[KernelWarning]]:
+    """Exécute les notebooks dans un pool de `workers` processus (un kernel chacun).
+
+    Chaque notebook est soumis dès qu'il est découvert. Un notebook qui plante
+    ou dépasse son délai n'affecte pas les autres : il est simplement compté
+    sans warnings.
+    """
+    results: Dict[Path, List[KernelWarning]] = {}
+    if workers <= 1:
+        for p in nb_paths:
+            results[p], cached, seconds = _execute_timed(p)
+            _record_execution(p, cached, seconds)
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_execute_timed, p): p for p in nb_paths}
+        for fut in as_completed(futures):
+            nb_path = futures[fut]
+            try:
+                results[nb_path], cached, seconds = fut.result()
+                _record_execution(nb_path, cached, seconds)
+            except Exception as exc:
+                print(f"⚠️  Worker failure on {nb_path.name}: {exc}")
+                METRICS.inc("notebooks_total", result="worker-failure")
+                results[nb_path] = []
+    return results
+
+
+def is_deprecation(w: KernelWarning) -> bool:
+    return w.category in DEPRECATION_CATEGORIES or "deprecated" in w.message.lower()
 
 
 def llm_fix(code: str, warn_msg: str) -> str:
     prompt = HumanMessage(
         content=(
             f"Warning message:\n{warn_msg}\n\nProblematic code:\n" + code + "\n\nCorrect it."))
-    return chat.invoke([SYS_MSG, prompt]).content.strip()
+    key = make_key(MODEL_NAME, SYS_MSG.content, prompt.content)
+    cached = CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    METRICS.inc("llm_requests_total")
+    prompt_chars = len(SYS_MSG.content) + len(prompt.content)
+    max_tokens = max_tokens_for(code)
+    try:
+        with METRICS.stage("llm"):
+            # sortie plafonnée ; en flux, interrompue dès qu'elle dérive (obso_stream)
+            if LLM_STREAM:
+                resp = chat.stream([SYS_MSG, prompt], check=CodeGuard(code).check,
+                                   max_tokens=max_tokens)
+            else:
+                resp = chat.invoke([SYS_MSG, prompt], max_tokens=max_tokens)
+    except StreamAborted as exc:
+        METRICS.inc("llm_aborted_total", reason=exc.reason)
+        METRICS.count_usage(SimpleNamespace(content=exc.text), prompt_chars)
+        raise
+    except Exception:
+        METRICS.inc("llm_errors_total")
+        raise
+    METRICS.count_usage(resp, prompt_chars)
+    if truncated(resp, max_tokens):
+        METRICS.inc("llm_aborted_total", reason="truncated")
+        raise StreamAborted("truncated", resp.content)
+    fixed = resp.content.strip()
+    if is_valid_py(fixed):  # une réponse invalide n'est pas resservie
+        CACHE.put(key, fixed)
+    return fixed
 
 
 def is_valid_py(code: str) -> bool:
@@ -72,44 +215,119 @@ def is_valid_py(code: str) -> bool:
     except SyntaxError:
         return False
 
+
+def sliced_llm_fix(code: str, warn_msg: str, lines) -> str:
+    """llm_fix limité aux instructions des lignes signalées, recollées en place."""
+    slices = slice_statements(code, lines)
+    if slices:
+        fixed = splice(code, slices, [llm_fix(sl.code, warn_msg) for sl in slices])
+        if is_valid_py(fixed):
+            return fixed
+    return llm_fix(code, warn_msg)
+
+
+def verify_patched(nb_path: Path, sources: Dict[int, str], patched: Dict[int, str],
+                   targeted: Dict[int, set]) -> Dict[int, str]:
+    """Garde les corrections confirmées par ré-exécution (obso_verify.verify_fixes).
+
+    Seules les cellules corrigées et celles dont elles dépendent sont
+    rejouées. Si la vérification elle-même échoue (kernel, délai), les
+    corrections sont gardées sans verdict plutôt que perdues.
+    """
+    try:
+        with METRICS.stage("verify"):
+            metadata = nbformat.read(nb_path, as_version=4).metadata
+            verdicts = verify_fixes(metadata, sources, patched, targeted, _run_instrumented)
+    except Exception as exc:
+        print(f"⚠️  Verification skipped for {nb_path.name}: {exc}")
+        METRICS.inc("verify_total", len(patched), result="skipped")
+        return patched
+    kept = {}
+    for idx, code in patched.items():
+        verdict = verdicts[idx]
+        METRICS.inc("verify_total", result="accepted" if verdict.accepted else "rejected")
+        if verdict.accepted:
+            kept[idx] = code
+        else:
+            print(f"✗ Cell {idx} fix rejected in {nb_path.name}: {verdict.reason}")
+            METRICS.inc("cells_total", stage="rejected")
+    return kept
+
 # ---------------------------------------------------------------------------
 # TRAITEMENT NOTEBOOK
 # ---------------------------------------------------------------------------
 
-def process_notebook(nb_path: Path) -> bool:
-    warnings_list = execute_and_collect(nb_path)
+def process_notebook(nb_path: Path,
+                     warnings_list: Optional[List[KernelWarning]] = None) -> bool:
+    if warnings_list is None:
+        warnings_list = execute_and_collect(nb_path)
     print(f"{nb_path.name} → warnings capturés : {len(warnings_list)}")
     for w in warnings_list:
-        print("   •", w.message)
+        print(f"   • [cell {w.cell}, line {w.line}] {w.category}: {w.message}")
 
-    if not warnings_list:
-        return False
+    # cellule → messages (dédoublonnés, dans l'ordre d'apparition) et lignes fautives
+    by_cell: Dict[int, List[str]] = {}
+    lines: Dict[int, set] = {}
+    targeted: Dict[int, set] = {}  # messages bruts, comparés après ré-exécution
+    for w in warnings_list:
+        if not is_deprecation(w):
+            continue
+        msgs = by_cell.setdefault(w.cell, [])
+        targeted.setdefault(w.cell, set()).add(w.message)
+        if w.line:
+            lines.setdefault(w.cell, set()).add(w.line)
+        msg = f"{w.category} (line {w.line}): {w.message}" if w.line else f"{w.category}: {w.message}"
+        if msg not in msgs:
+            msgs.append(msg)
 
-    nb = nbformat.read(nb_path, as_version=4)
-    modified = False
+    if not by_cell:
+        return False
 
+    # sources lues sans les outputs ; seules les cellules corrigées sont réécrites
+    with METRICS.stage("read"):
+        sources = {cell.index: cell.source for cell in read_code_cells(nb_path)}
+    patched: Dict[int, str] = {}
+    first_msg: Dict[int, str] = {}
+    try:
+        rel = nb_path.resolve().relative_to(REPO_ROOT).as_posix()
+    except ValueError:
+        rel = nb_path.name
     for w in warnings_list:
-        warn_msg = str(w.message)
-        if not ("deprecated" in warn_msg.lower() or "futurewarning" in warn_msg.lower()):
-            continue
+        if is_deprecation(w):
+            SIGNATURES.observe(w.category, w.message, sources.get(w.cell, ""), w.line, rel)
 
-        for cell in nb.cells:
-            if cell.cell_type != "code":
-                continue
-            src = cell["source"]
-            if not code_needs_fix(src, warn_msg):
-                continue
+    for idx, msgs in by_cell.items():
+        src = sources[idx]
+        warn_msg = "\n".join(msgs)
+        try:
+            fixed = sliced_llm_fix(src, warn_msg, lines.get(idx, ()))
+        except StreamAborted as exc:  # réponse hors sujet : la cellule reste telle quelle
+            print(f"✂️  LLM answer aborted on cell {idx} of {nb_path.name}: {exc.reason}")
+            METRICS.inc("cells_total", stage="original")
+            continue
+        except Exception as exc:  # une cellule en échec n'arrête pas le run
+            print(f"⚠️  LLM failure on cell {idx} of {nb_path.name}: {exc}")
+            METRICS.inc("cells_total", stage="llm-error")
+            continue
+        with METRICS.stage("validate"):
+            ok = bool(fixed) and fixed != src and is_valid_py(fixed)
+        if ok:
+            patched[idx] = fixed
+            first_msg[idx] = msgs[0]
+        else:
+            METRICS.inc("cells_total", stage="original")
 
-            fixed = llm_fix(src, warn_msg)
-            if fixed and fixed != src and is_valid_py(fixed):
-                cell["source"] = fixed
-                modified = True
-                print(f"→ Cell fixed in {nb_path.name} for warning: {warn_msg[:60]}…")
-                break  # passe au warning suivant
+    if patched and VERIFY_FIXES:
+        patched = verify_patched(nb_path, sources, patched, targeted)
+    for idx in patched:
+        METRICS.inc("cells_total", stage="llm")
+        print(f"→ Cell {idx} fixed in {nb_path.name} for warning: {first_msg[idx][:60]}…")
 
-    if modified:
-        nbformat.write(nb, nb_path)
-    return modified
+    if patched:
+        with METRICS.stage("write"):
+            patch_cell_sources(nb_path, patched)
+        METRICS.inc("notebooks_total", result="patched")
+    return bool(patched)
 
 # ---------------------------------------------------------------------------
 # MAIN ENTRY
@@ -117,8 +335,10 @@ def process_notebook(nb_path: Path) -> bool:
 
 def main() -> None:
     changed = []
-    for nb in REPO_ROOT.rglob("*.ipynb"):
-        if process_notebook(nb):
+    collected = execute_all(iter_notebooks(REPO_ROOT))
+    METRICS.inc("notebooks_total", len(collected), result="executed")
+    for nb in sorted(collected):
+        if process_notebook(nb, collected[nb]):
             changed.append(nb.relative_to(REPO_ROOT))
 
     if changed:
@@ -128,6 +348,23 @@ def main() -> None:
         print("Push these commits when ready.")
     else:
         print("👍  No deprecation warnings found across notebooks.")
+    print(f"💾  LLM cache: {CACHE.summary()}")
+    try:
+        SIGNATURES.save()
+    except OSError as exc:
+        print(f"⚠️  Signatures not saved: {exc}")
+    else:
+        print(f"📚  Signatures: {SIGNATURES.added} new, {len(SIGNATURES.signatures)} known")
+    METRICS.inc("cache_lookups_total", CACHE.hits, result="hit")
+    METRICS.inc("cache_lookups_total", CACHE.misses, result="miss")
+    print(f"⏱️  Stages (cumulative): {METRICS.summary()}")
+    try:
+        written = METRICS.export()
+    except OSError as exc:
+        print(f"⚠️  Metrics not written: {exc}")
+    else:
+        if written:
+            print("📈  Metrics: " + ", ".join(str(p) for p in written))
 
 
 if __name__ == "__main__":
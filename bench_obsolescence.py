@@ -0,0 +1,488 @@
+#!/usr/bin/env python
+# bench_obsolescence.py – banc d'essai hors ligne des deux agents
+"""
+Génère un corpus synthétique de notebooks puis fait tourner
+agent_obsolescence.py et/ou agent_obsolescence_dyn.py contre un faux modèle
+de chat local (latence et taux d'erreur réglables). Aucun appel réseau.
+
+Exemple :
+    python bench_obsolescence.py --notebooks 200 --cells 30 --density 0.2 \\
+        --blob-kb 256 --latency 0.3 --error-rate 0.02 --agent static
+
+Chaque agent tourne dans un processus séparé (RSS mesuré isolément) ; le
+rapport donne notebooks/s, cellules/s, RSS max et le temps cumulé par étape.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import functools
+import inspect
+import io
+import json
+import multiprocessing as mp
+import os
+import random
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict
+
+# ---------------------------------------------------------------------------
+# CORPUS SYNTHÉTIQUE
+# ---------------------------------------------------------------------------
+
+# Première cellule : objets factices dont les méthodes « dépréciées » émettent
+# un FutureWarning, pour que le corpus s'exécute sans pandas. Ils vivent dans
+# un module à part, comme une vraie bibliothèque : le warning est attribué à
+# la cellule appelante.
+PRELUDE = '''import types
+
+fakepd = types.ModuleType("fakepd")
+exec("""
+import warnings
+
+class Frame:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def ravel(self, *args):
+        warnings.warn("Series.ravel is deprecated, use to_numpy", FutureWarning, stacklevel=2)
+        return self
+
+    def format(self, **kwargs):
+        warnings.warn("Index.format is deprecated, use astype(str)", FutureWarning, stacklevel=2)
+        return []
+
+    def to_numpy(self, *args):
+        return self
+
+    def astype(self, _):
+        return self
+
+    def tolist(self):
+        return []
+Series = Index = Frame
+""", fakepd.__dict__)
+pd = fakepd
+s = idx = fakepd.Frame()
+'''
+
+# Cellules signalées : les unes se corrigent par codemod, les autres exigent le LLM
+CODEMOD_CELLS = [
+    "s = pd.Series([1, 2])\nvalues = s.ravel()\ntotal = 1",
+    "idx = pd.Index(['a', 'b'])\nlabels = idx.format()\nprint(len(labels))",
+]
+LLM_CELLS = [
+    "values = s.ravel('F')\ntotal = 2",
+    "labels = idx.format(name=True)\nprint(len(labels))",
+]
+CLEAN_CELLS = [
+    "x = {i} * 2\ny = x + 1",
+    "def f_{i}(a):\n    return a + {i}\n\nf_{i}(3)",
+    "data = [k for k in range({i})]\nlen(data)",
+]
+
+
+def _cell(source: str, blob: str) -> Dict:
+    outputs = []
+    if blob:
+        outputs.append({"output_type": "display_data", "metadata": {},
+                        "data": {"image/png": blob, "text/plain": ["<Figure>"]}})
+    return {"cell_type": "code", "execution_count": None, "metadata": {},
+            "outputs": outputs, "source": source.splitlines(keepends=True)}
+
+
+def generate_corpus(root: Path, notebooks: int, cells: int, density: float,
+                    llm_share: float, blob_kb: int, seed: int = 0) -> int:
+    """Écrit `notebooks` fichiers .ipynb sous `root` ; renvoie le nombre de cellules."""
+    rng = random.Random(seed)
+    blob = base64.b64encode(rng.randbytes(blob_kb * 1024)).decode() if blob_kb else ""
+    total = 0
+    for n in range(notebooks):
+        nb_cells = [_cell(PRELUDE, "")]
+        for i in range(cells):
+            if rng.random() < density:
+                pool = LLM_CELLS if rng.random() < llm_share else CODEMOD_CELLS
+                src = rng.choice(pool)
+            else:
+                src = rng.choice(CLEAN_CELLS).format(i=i)
+            # une seule grosse sortie par notebook suffit à peser sur les lectures
+            nb_cells.append(_cell(src, blob if i == 0 else ""))
+        doc = {"cells": nb_cells, "metadata": {"kernelspec": {
+            "display_name": "Python 3", "language": "python", "name": "python3"}},
+            "nbformat": 4, "nbformat_minor": 5}
+        path = root / f"part{n // 100:03d}" / f"nb_{n:05d}.ipynb"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(doc, indent=1, ensure_ascii=False) + "\n", encoding="utf-8")
+        total += len(nb_cells)
+    return total
+
+
+# ---------------------------------------------------------------------------
+# FAUX MODÈLE DE CHAT
+# ---------------------------------------------------------------------------
+
+def _fake_fix(code: str) -> str:
+    return (code.replace(".ravel(", ".to_numpy(")
+                .replace(".format(name=True)", ".astype(str).tolist()")
+                .replace(".format()", ".astype(str).tolist()")
+                .replace("freq='Q'", "freq='QE'"))
+
+
+class FakeHTTPError(RuntimeError):
+    """Erreur serveur simulée, classée comme passagère par obso_client."""
+    status_code = 503
+
+
+# Réponse « hors consigne » : prose, fence markdown et explication interminable
+RUNAWAY = ("Sure! Here is the corrected code:\n```python\n{code}\n```\n\n"
+           + "This version replaces the deprecated call with its modern equivalent. " * 20)
+STREAM_CHUNK = 16  # caractères par morceau de flux
+
+
+class FakeResponse:
+    """Comme langchain_mistralai : finish_reason en appel simple seulement ; en
+    flux, seul le dernier morceau porte usage_metadata (tokens de sortie)."""
+
+    def __init__(self, content: str, finish_reason: str = "", output_tokens: int = 0):
+        self.content = content
+        self.response_metadata = {"finish_reason": finish_reason} if finish_reason else {}
+        self.usage_metadata = {"output_tokens": output_tokens} if output_tokens else None
+
+    def __add__(self, other: "FakeResponse") -> "FakeResponse":
+        tokens = sum((r.usage_metadata or {}).get("output_tokens", 0) for r in (self, other))
+        return FakeResponse(self.content + other.content, output_tokens=tokens)
+
+
+class FakeChat:
+    """Remplace ChatMistralAI : même interface invoke/ainvoke/stream/astream, réponses déterministes.
+
+    Une part `runaway` des réponses part à la dérive (RUNAWAY) ; la durée
+    d'une réponse croît avec sa longueur et `max_tokens` la tronque.
+    """
+
+    def __init__(self, latency: float, jitter: float, error_rate: float, seed: int = 0,
+                 runaway: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.runaway = runaway
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self.prompt_chars = 0
+        self.completion_chars = 0  # caractères effectivement envoyés
+
+    def _delay(self) -> float:
+        return max(0.0, self.rng.gauss(self.latency, self.jitter))
+
+    def _respond(self, messages, max_tokens=None):
+        """(réponse, durée totale) ; une réponse longue prend proportionnellement plus de temps."""
+        text = self._answer(messages)
+        delay = self._delay()
+        if self.rng.random() < self.runaway:
+            good, text = len(text), RUNAWAY.format(code=text)
+            delay *= len(text) / max(1, good)
+        finish = ""
+        if max_tokens and len(text) > max_tokens * 4:
+            delay *= max_tokens * 4 / len(text)
+            text, finish = text[:max_tokens * 4], "length"
+        return FakeResponse(text, finish, -(-len(text) // 4)), delay
+
+    def _chunks(self, resp: FakeResponse):
+        text = resp.content
+        pieces = [text[i:i + STREAM_CHUNK] for i in range(0, len(text), STREAM_CHUNK)] or [""]
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            yield FakeResponse(piece, output_tokens=resp.usage_metadata["output_tokens"]
+                               if last and resp.usage_metadata else 0)
+
+    def _answer(self, messages) -> str:
+        self.calls += 1
+        text = messages[-1].content
+        self.prompt_chars += sum(len(m.content) for m in messages)
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise FakeHTTPError("fake backend: 503 Service Unavailable")
+        if "Cells (JSON):\n" in text:
+            cells = json.loads(text.split("Cells (JSON):\n", 1)[1])
+            return json.dumps({k: _fake_fix(v) for k, v in cells.items()})
+        m = (re.search(r"Code to fix:\n(.*?)\n\nReplace any deprecated", text, re.S)
+             or re.search(r"Problematic code:\n(.*?)\n\nCorrect it\.", text, re.S))
+        return _fake_fix(m.group(1) if m else text)
+
+    def invoke(self, messages, max_tokens=None, **kwargs) -> FakeResponse:
+        resp, delay = self._respond(messages, max_tokens)
+        time.sleep(delay)
+        self.completion_chars += len(resp.content)
+        return resp
+
+    async def ainvoke(self, messages, max_tokens=None, **kwargs) -> FakeResponse:
+        resp, delay = self._respond(messages, max_tokens)
+        await asyncio.sleep(delay)
+        self.completion_chars += len(resp.content)
+        return resp
+
+    def stream(self, messages, max_tokens=None, **kwargs):
+        resp, delay = self._respond(messages, max_tokens)
+        chunks = list(self._chunks(resp))
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            self.completion_chars += len(chunk.content)
+            yield chunk
+
+    async def astream(self, messages, max_tokens=None, **kwargs):
+        resp, delay = self._respond(messages, max_tokens)
+        chunks = list(self._chunks(resp))
+        for chunk in chunks:
+            await asyncio.sleep(delay / len(chunks))
+            self.completion_chars += len(chunk.content)
+            yield chunk
+
+
+# ---------------------------------------------------------------------------
+# CHRONOMÉTRAGE PAR ÉTAPE
+# ---------------------------------------------------------------------------
+
+class StageTimer:
+    def __init__(self):
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timed_async(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.seconds[stage] += time.perf_counter() - start
+                    self.calls[stage] += 1
+            return timed_async
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def timed_stream(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    async for item in func(*args, **kwargs):
+                        yield item
+                finally:
+                    self.seconds[stage] += time.perf_counter() - start
+                    self.calls[stage] += 1
+            return timed_stream
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def timed_iter(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    yield from func(*args, **kwargs)
+                finally:
+                    self.seconds[stage] += time.perf_counter() - start
+                    self.calls[stage] += 1
+            return timed_iter
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - start
+                self.calls[stage] += 1
+        return timed
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {k: {"seconds": round(v, 4), "calls": self.calls[k]}
+                for k, v in sorted(self.seconds.items())}
+
+
+def _timed_iter(timer: StageTimer, stage: str, iterable):
+    it = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            timer.seconds[stage] += time.perf_counter() - start
+            return
+        timer.seconds[stage] += time.perf_counter() - start
+        timer.calls[stage] += 1
+        yield item
+
+
+# ---------------------------------------------------------------------------
+# EXÉCUTION DES AGENTS (un processus par agent)
+# ---------------------------------------------------------------------------
+
+def _run_static(opts: Dict) -> Dict:
+    import agent_obsolescence as A
+    from obso_client import ResilientChat
+
+    timer = StageTimer()
+    chat = FakeChat(opts["latency"], opts["jitter"], opts["error_rate"], opts["seed"],
+                    opts["runaway"])
+    A._chat = ResilientChat(chat, concurrency=A.LLM_CONCURRENCY, metrics=A.METRICS)
+    A.read_code_cells = timer.wrap("read", A.read_code_cells)
+    A.MATCHER.search = timer.wrap("match", A.MATCHER.search)
+    A.MATCHER.scan = timer.wrap("match", A.MATCHER.scan)
+    A.try_codemods = timer.wrap("codemod", A.try_codemods)
+    A.is_valid_python = timer.wrap("validate", A.is_valid_python)
+    A.patch_cell_sources = timer.wrap("write", A.patch_cell_sources)
+    chat.ainvoke = timer.wrap("llm", chat.ainvoke)
+    chat.astream = timer.wrap("llm", chat.astream)
+
+    argv = ["--batch-tokens", str(opts["batch_tokens"])]
+    finder_iter = A.NotebookFinder.__iter__
+    A.NotebookFinder.__iter__ = lambda self: _timed_iter(timer, "discovery", finder_iter(self))
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        A.main(argv)
+    return _result(time.perf_counter() - start, timer, chat, {
+        "stages_outcome": dict(A.STAGE_STATS), "cache": A.CACHE.summary()})
+
+
+def _run_dyn(opts: Dict) -> Dict:
+    import agent_obsolescence_dyn as D
+    from obso_client import ResilientChat
+
+    timer = StageTimer()
+    chat = FakeChat(opts["latency"], opts["jitter"], opts["error_rate"], opts["seed"],
+                    opts["runaway"])
+    D.chat = ResilientChat(chat, concurrency=1, metrics=D.METRICS)
+    chat.invoke = timer.wrap("llm", chat.invoke)
+    chat.stream = timer.wrap("llm", chat.stream)
+    D.execute_all = timer.wrap("execute", D.execute_all)
+    D.read_code_cells = timer.wrap("read", D.read_code_cells)
+    D.is_valid_py = timer.wrap("validate", D.is_valid_py)
+    D.patch_cell_sources = timer.wrap("write", D.patch_cell_sources)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        D.main()
+    return _result(time.perf_counter() - start, timer, chat, {"cache": D.CACHE.summary()})
+
+
+def _result(wall: float, timer: StageTimer, chat: FakeChat, extra: Dict) -> Dict:
+    usage_self = resource.getrusage(resource.RUSAGE_SELF)
+    usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss : octets (macOS) / Kio
+    return {
+        "wall_seconds": round(wall, 3),
+        "peak_rss_mb": round(usage_self.ru_maxrss * scale / 2**20, 1),
+        "peak_rss_children_mb": round(usage_children.ru_maxrss * scale / 2**20, 1),
+        "llm_calls": chat.calls,
+        "llm_errors": chat.errors,
+        "completion_chars": chat.completion_chars,
+        "prompt_chars": chat.prompt_chars,
+        "stages": timer.report(),
+        **extra,
+    }
+
+
+def _child(agent: str, opts: Dict, corpus: str, cache_dir: str, queue) -> None:
+    os.environ["CONTENT_REPO"] = corpus
+    os.environ["OBSO_CACHE_DIR"] = cache_dir
+    os.environ.setdefault("MISTRAL_API_KEY", "bench-offline")
+    os.environ["LLM_RATE"] = str(opts["rate"])
+    os.environ["LLM_BACKOFF_BASE"] = str(opts["backoff"])
+    os.environ["LLM_STREAM"] = "1" if opts["stream"] else "0"
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    try:
+        queue.put(("ok", (_run_static if agent == "static" else _run_dyn)(opts)))
+    except BaseException as exc:  # le parent doit toujours recevoir une réponse
+        queue.put(("error", repr(exc)))
+
+
+def run_agent(agent: str, opts: Dict, corpus: Path, cache_dir: Path) -> Dict:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(agent, opts, str(corpus), str(cache_dir), queue))
+    proc.start()
+    status, payload = queue.get()
+    proc.join()
+    if status != "ok":
+        raise RuntimeError(f"{agent}: {payload}")
+    return payload
+
+
+# ---------------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------------
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Banc d'essai hors ligne des agents anti-obsolescence.")
+    p.add_argument("--agent", choices=["static", "dyn", "both"], default="static")
+    p.add_argument("--notebooks", type=int, default=50)
+    p.add_argument("--cells", type=int, default=20, help="cellules par notebook (hors prélude)")
+    p.add_argument("--density", type=float, default=0.2, help="part de cellules signalées")
+    p.add_argument("--llm-share", type=float, default=0.5,
+                   help="part des cellules signalées qu'aucun codemod ne corrige")
+    p.add_argument("--blob-kb", type=int, default=64, help="taille de la sortie image par notebook")
+    p.add_argument("--latency", type=float, default=0.2, help="latence moyenne du faux LLM (s)")
+    p.add_argument("--jitter", type=float, default=0.05)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--runaway", type=float, default=0.0,
+                   help="part des réponses hors consigne (prose, fences, texte sans fin)")
+    p.add_argument("--no-stream", dest="stream", action="store_false",
+                   help="LLM_STREAM=0 : réponses attendues en entier")
+    p.add_argument("--batch-tokens", type=int, default=0)
+    p.add_argument("--rate", type=float, default=0, help="LLM_RATE (req/s, 0 = illimité)")
+    p.add_argument("--backoff", type=float, default=0.05, help="LLM_BACKOFF_BASE (s)")
+    p.add_argument("--warm-cache", action="store_true",
+                   help="mesurer un second run sur le même cache (corpus régénéré)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--keep", action="store_true", help="conserver le corpus généré")
+    p.add_argument("--json", metavar="PATH", help="écrire le rapport JSON dans ce fichier")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    opts = {k: getattr(args, k) for k in ("latency", "jitter", "error_rate", "seed",
+                                          "batch_tokens", "rate", "backoff", "runaway",
+                                          "stream")}
+    agents = ["static", "dyn"] if args.agent == "both" else [args.agent]
+    workdir = Path(tempfile.mkdtemp(prefix="obso-bench-"))
+    report = {"params": vars(args), "runs": []}
+    try:
+        for agent in agents:
+            cache_dir = workdir / f"cache-{agent}"
+            for attempt in range(2 if args.warm_cache else 1):
+                corpus = workdir / f"corpus-{agent}-{attempt}"
+                cells = generate_corpus(corpus, args.notebooks, args.cells, args.density,
+                                        args.llm_share, args.blob_kb, args.seed)
+                res = run_agent(agent, opts, corpus, cache_dir)
+                wall = res["wall_seconds"] or 1e-9
+                res.update(agent=agent, cache="warm" if attempt else "cold",
+                           notebooks_per_s=round(args.notebooks / wall, 2),
+                           cells_per_s=round(cells / wall, 1))
+                report["runs"].append(res)
+                print(f"{agent:6s} {res['cache']:4s} | {res['wall_seconds']:8.2f}s | "
+                      f"{res['notebooks_per_s']:8.2f} nb/s | {res['cells_per_s']:9.1f} cells/s | "
+                      f"RSS {res['peak_rss_mb']:.0f} MB (+{res['peak_rss_children_mb']:.0f}) | "
+                      f"LLM {res['llm_calls']} calls, {res['llm_errors']} err, "
+                      f"{res['completion_chars']} chars out")
+                for stage, st in res["stages"].items():
+                    print(f"    {stage:10s} {st['seconds']:9.3f}s  ({st['calls']} calls)")
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            print(f"corpus conservé dans {workdir}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# obso_cache.py – cache disque des corrections LLM (adressé par contenu)
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+# ---------------------------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------------------------
+
+CACHE_DIR = Path(os.getenv(
+    "OBSO_CACHE_DIR", Path.home() / ".cache" / "agent_obsolescence")).expanduser()
+CACHE_MAX_MB = int(os.getenv("OBSO_CACHE_MAX_MB", "64"))
+
+
+def make_key(*parts: str) -> str:
+    """Hash SHA-256 des éléments (longueur préfixée pour éviter les collisions)."""
+    h = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# CACHE LRU SUR DISQUE
+# ---------------------------------------------------------------------------
+
+class FixCache:
+    """Un fichier par entrée ; l'ordre LRU suit le mtime, rafraîchi à chaque hit."""
+
+    def __init__(self, root: Path = CACHE_DIR, max_bytes: int = CACHE_MAX_MB * 1024 * 1024):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._load()
+
+    def _load(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for p in self.root.glob("*.txt"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, p.stem, st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._size += size
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.txt"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            value = path.read_text(encoding="utf-8")
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        if key in self._index:
+            self._index.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        data = value.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        # écriture atomique : plusieurs jobs CI peuvent partager le répertoire
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, self._path(key))
+
+        self._size -= self._index.pop(key, 0)
+        self._index[key] = len(data)
+        self._size += len(data)
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total else 0.0
+        return (f"{self.hits} hits / {self.misses} misses ({rate:.0f} %), "
+                f"{self.evictions} évictions, {len(self._index)} entrées")
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# obso_client.py – client LLM résilient : débit, relances, concurrence adaptative, disjoncteur
+
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Optional, Tuple
+
+# ---------------------------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------------------------
+
+LLM_RATE = float(os.getenv("LLM_RATE", "5"))                 # requêtes/s (seau à jetons)
+LLM_BURST = int(os.getenv("LLM_BURST", "10"))                # rafale autorisée
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))     # relances par requête
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1"))  # s, doublé à chaque relance
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))  # échecs consécutifs
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # s avant un essai
+
+# 429 et erreurs serveur passagères : on relance ; le reste (400, 401…) échoue tout de suite
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# Erreurs réseau reconnues par leur nom (httpx, asyncio, stdlib) sans importer httpx
+TRANSIENT_ERRORS = {"TimeoutError", "TimeoutException", "TransportError", "RequestError",
+                    "NetworkError", "ConnectError", "ReadError", "RemoteProtocolError",
+                    "StreamError", "ConnectionError"}
+
+
+class CircuitOpenError(RuntimeError):
+    """Le disjoncteur est ouvert : l'appel n'est pas tenté."""
+
+
+class StreamAborted(RuntimeError):
+    """Réponse interrompue en cours de flux par l'appelant (voir obso_stream)."""
+
+    def __init__(self, reason: str, text: str = ""):
+        super().__init__(f"réponse interrompue ({reason})")
+        self.reason = reason
+        self.text = text   # partie reçue avant l'interruption
+
+
+# ---------------------------------------------------------------------------
+# CLASSIFICATION DES ERREURS
+# ---------------------------------------------------------------------------
+
+def _retry_after(headers) -> Optional[float]:
+    """Délai demandé par l'en-tête Retry-After (secondes ou date HTTP)."""
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def classify(exc: BaseException) -> Tuple[bool, bool, Optional[float]]:
+    """Renvoie (relançable, limitation de débit, Retry-After éventuel)."""
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None) or getattr(exc, "status_code", None)
+    if status is not None:
+        headers = getattr(response, "headers", None) or getattr(exc, "headers", None)
+        return status in RETRYABLE_STATUS, status == 429, _retry_after(headers)
+    transient = any(cls.__name__ in TRANSIENT_ERRORS for cls in type(exc).__mro__)
+    return transient, False, None
+
+
+# ---------------------------------------------------------------------------
+# BRIQUES
+# ---------------------------------------------------------------------------
+
+class TokenBucket:
+    """Seau à jetons : `rate` requêtes/s en régime, `burst` d'un coup au plus.
+
+    Chaque appel réserve un jeton (le solde peut devenir négatif) et renvoie
+    l'attente nécessaire, ce qui sert les appelants dans l'ordre d'arrivée.
+    """
+
+    def __init__(self, rate: float = LLM_RATE, burst: int = LLM_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:  # 0 = pas de limite
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self) -> None:
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class AIMDLimiter:
+    """Concurrence adaptative : +1 par « fenêtre » réussie, divisée par 2 sur un 429."""
+
+    def __init__(self, maximum: int, minimum: int = 1, decrease: float = 0.5):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.decrease = decrease
+        self.limit = float(self.maximum)
+        self.inflight = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self._loop = None
+
+    def _condition(self) -> asyncio.Condition:
+        # un asyncio.run() par notebook est possible : une Condition par boucle
+        loop = asyncio.get_running_loop()
+        if self._cond is None or self._loop is not loop:
+            self._cond, self._loop = asyncio.Condition(), loop
+        return self._cond
+
+    async def __aenter__(self) -> "AIMDLimiter":
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        cond = self._condition()
+        async with cond:
+            self.inflight -= 1
+            cond.notify_all()
+
+    def on_success(self) -> None:
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_throttle(self) -> None:
+        self.limit = max(self.minimum, self.limit * self.decrease)
+
+
+class CircuitBreaker:
+    """Ouvert après `threshold` échecs consécutifs ; un seul essai après `cooldown`."""
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD,
+                 cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> None:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open" and not self.trial:
+                self.trial = True
+                return
+        raise CircuitOpenError("LLM indisponible (disjoncteur ouvert)")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures, self.opened_at, self.trial = 0, None, False
+
+    def record_failure(self) -> bool:
+        """Renvoie True si cet échec ouvre (ou rouvre) le disjoncteur."""
+        with self._lock:
+            self.failures += 1
+            reopen = self.trial or (self.opened_at is None and self.failures >= self.threshold)
+            if reopen:
+                self.opened_at, self.trial = time.monotonic(), False
+            return reopen
+
+
+# ---------------------------------------------------------------------------
+# CLIENT
+# ---------------------------------------------------------------------------
+
+class ResilientChat:
+    """Enveloppe un client langchain (invoke / ainvoke) avec la même interface.
+
+    Chaque tentative prend un jeton du seau et une place du limiteur AIMD ;
+    les erreurs passagères sont relancées avec un backoff exponentiel à
+    gigue complète (ou le délai Retry-After du serveur). Quand le
+    disjoncteur est ouvert, les appels échouent aussitôt avec
+    CircuitOpenError : l'appelant passe à ses fallbacks déterministes.
+    """
+
+    def __init__(self, chat, concurrency: int = 8, bucket: Optional[TokenBucket] = None,
+                 breaker: Optional[CircuitBreaker] = None, max_retries: int = LLM_MAX_RETRIES,
+                 backoff_base: float = LLM_BACKOFF_BASE, backoff_max: float = LLM_BACKOFF_MAX,
+                 metrics=None):
+        self.chat = chat
+        self.bucket = bucket or TokenBucket()
+        self.limiter = AIMDLimiter(concurrency)
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = metrics
+
+    def _inc(self, name: str, **labels: str) -> None:
+        if self.metrics is not None:
+            self.metrics.inc(name, **labels)
+
+    def _delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = min(self.backoff_max, retry_after) + random.uniform(0, self.backoff_base)
+        return delay
+
+    def _on_error(self, exc: Exception, attempt: int) -> float:
+        """Relance (renvoie le délai) ou relève l'exception."""
+        retryable, throttled, retry_after = classify(exc)
+        if throttled:
+            self.limiter.on_throttle()
+        # l'essai du disjoncteur entrouvert n'est pas relancé : il tranche
+        if retryable and attempt < self.max_retries and not self.breaker.trial:
+            self._inc("llm_backoff_total", reason="throttled" if throttled else "transient")
+            return self._delay(attempt, retry_after)
+        if self.breaker.record_failure():
+            self._inc("llm_breaker_open_total")
+        raise exc
+
+    def _on_success(self) -> None:
+        self.breaker.record_success()
+        self.limiter.on_success()
+
+    def invoke(self, messages, **kwargs):
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            self.bucket.acquire()
+            try:
+                resp = self.chat.invoke(messages, **kwargs)
+            except Exception as exc:
+                time.sleep(self._on_error(exc, attempt))
+                attempt += 1
+                continue
+            self._on_success()
+            return resp
+
+    async def ainvoke(self, messages, **kwargs):
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            await self.bucket.aacquire()
+            try:
+                async with self.limiter:
+                    resp = await self.chat.ainvoke(messages, **kwargs)
+            except Exception as exc:
+                await asyncio.sleep(self._on_error(exc, attempt))
+                attempt += 1
+                continue
+            self._on_success()
+            return resp
+
+    # -- flux ----------------------------------------------------------------
+    # Même politique que invoke / ainvoke, la réponse étant lue morceau par
+    # morceau : `check(texte reçu)` est appelé après chaque morceau et peut
+    # lever StreamAborted, qui ferme le flux. Une interruption n'est ni
+    # relancée ni comptée comme un échec : le serveur a répondu.
+
+    def _consume(self, messages, check: Optional[Callable[[str], None]], **kwargs):
+        stream = self.chat.stream(messages, **kwargs)
+        resp = None
+        try:
+            for chunk in stream:
+                resp = chunk if resp is None else resp + chunk
+                if check is not None:
+                    check(resp.content)
+        finally:
+            stream.close()  # libère la connexion si on s'arrête avant la fin
+        return resp if resp is not None else SimpleNamespace(content="")
+
+    async def _aconsume(self, messages, check: Optional[Callable[[str], None]], **kwargs):
+        stream = self.chat.astream(messages, **kwargs)
+        resp = None
+        try:
+            async for chunk in stream:
+                resp = chunk if resp is None else resp + chunk
+                if check is not None:
+                    check(resp.content)
+        finally:
+            await stream.aclose()
+        return resp if resp is not None else SimpleNamespace(content="")
+
+    def stream(self, messages, check: Optional[Callable[[str], None]] = None, **kwargs):
+        """invoke en flux ; renvoie la réponse complète (morceaux additionnés)."""
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            self.bucket.acquire()
+            try:
+                resp = self._consume(messages, check, **kwargs)
+            except StreamAborted:
+                self._on_success()
+                raise
+            except Exception as exc:
+                time.sleep(self._on_error(exc, attempt))
+                attempt += 1
+                continue
+            self._on_success()
+            return resp
+
+    async def astream(self, messages, check: Optional[Callable[[str], None]] = None, **kwargs):
+        """ainvoke en flux ; renvoie la réponse complète (morceaux additionnés)."""
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            await self.bucket.aacquire()
+            try:
+                async with self.limiter:
+                    resp = await self._aconsume(messages, check, **kwargs)
+            except StreamAborted:
+                self._on_success()
+                raise
+            except Exception as exc:
+                await asyncio.sleep(self._on_error(exc, attempt))
+                attempt += 1
+                continue
+            self._on_success()
+            return resp
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# obso_codemods.py – réécritures libcst déterministes pour DEPRECATED_MAP
+
+from __future__ import annotations
+
+import ast
+import io
+import tokenize
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set
+
+import libcst as cst
+
+# Attributs « racine » dont les appels .ravel() sont ceux de numpy, pas de pandas
+NUMPY_ROOTS = {"np", "numpy"}
+PANDAS_ROOTS = {"pd", "pandas"}
+# pd.<fabrique>(...) renvoie un objet pandas (pd.read_* aussi)
+PANDAS_FACTORIES = {"Series", "DataFrame", "Index", "MultiIndex", "DatetimeIndex",
+                    "PeriodIndex", "RangeIndex", "date_range", "period_range",
+                    "timedelta_range", "concat", "merge", "pivot_table", "crosstab"}
+# Méthodes et attributs d'un objet pandas qui renvoient encore un objet pandas
+PANDAS_METHODS = {"head", "tail", "copy", "dropna", "fillna", "sort_values", "sort_index",
+                  "reset_index", "set_index", "astype", "rename", "drop", "query", "sample",
+                  "abs", "round", "ffill", "bfill", "drop_duplicates", "reindex", "shift"}
+PANDAS_ATTRS = {"index", "columns", "T", "loc", "iloc"}
+# … ou un ndarray (dont .ravel() n'est pas déprécié)
+NUMPY_METHODS = {"to_numpy", "ravel", "flatten"}
+NUMPY_ATTRS = {"values"}
+# Arguments nommés propres à Index.format (absents de str.format usuel)
+INDEX_FORMAT_KWARGS = {"name", "formatter", "na_rep"}
+# freq='Q' (fin de trimestre) est un offset déprécié au profit de 'QE' pour ces
+# appels ; pour les périodes ('Q' = trimestre) il reste valide et 'QE' lève
+FREQ_OFFSET_CALLS = {"resample", "date_range", "Grouper", "asfreq"}
+FREQ_PERIOD_CALLS = {"period_range", "Period", "PeriodIndex", "to_period"}
+
+STRING_NODES = (cst.SimpleString, cst.ConcatenatedString, cst.FormattedString)
+
+
+def _root_name(node: cst.BaseExpression) -> Optional[str]:
+    """Remonte a.b(c)[d].e jusqu'au nom de tête (« a »)."""
+    while True:
+        if isinstance(node, cst.Name):
+            return node.value
+        if isinstance(node, cst.Attribute):
+            node = node.value
+        elif isinstance(node, cst.Call):
+            node = node.func
+        elif isinstance(node, cst.Subscript):
+            node = node.value
+        else:
+            return None
+
+
+def _literal_kind(node: Optional[cst.BaseExpression]) -> Optional[str]:
+    """'int', 'label', 'empty' (borne absente) ou None si indéterminable."""
+    if node is None:
+        return "empty"
+    if isinstance(node, cst.Integer):
+        return "int"
+    if (isinstance(node, cst.UnaryOperation)
+            and isinstance(node.operator, cst.Minus)
+            and isinstance(node.expression, cst.Integer)):
+        return "int"
+    if isinstance(node, STRING_NODES):
+        return "label"
+    if isinstance(node, (cst.Comparison, cst.BooleanOperation)):
+        return "label"  # masque booléen : .loc
+    if isinstance(node, (cst.List, cst.Tuple)):
+        kinds = {_literal_kind(el.value) for el in node.elements}
+        return kinds.pop() if len(kinds) == 1 else None
+    return None
+
+
+def _ix_accessor(elements: Sequence[cst.SubscriptElement]) -> Optional[str]:
+    """Choisit .iloc (entiers) ou .loc (labels) ; None si ambigu."""
+    kinds: Set[str] = set()
+    for el in elements:
+        sl = el.slice
+        if isinstance(sl, cst.Index):
+            kinds.add(_literal_kind(sl.value) or "unknown")
+        elif isinstance(sl, cst.Slice):
+            bounds = {_literal_kind(sl.lower), _literal_kind(sl.upper)} - {"empty"}
+            if "int" in bounds:
+                # .ix[0:3] était inclusif sur un index entier : non déterministe
+                return None
+            kinds |= {b or "unknown" for b in bounds}
+    kinds.discard("empty")
+    if not kinds:
+        return "iloc"
+    if "int" in kinds:
+        # .ix[0] lisait le label 0 sur un index entier : non déterministe
+        return None
+    if kinds == {"label"}:
+        return "loc"
+    return None
+
+
+class DeprecationCodemod(cst.CSTTransformer):
+    """Réécrit les usages connus ; note ceux qu'il ne sait pas trancher.
+
+    .ravel() et .format() ne sont réécrits que si le receveur est un objet
+    pandas reconnu dans la cellule (pd.Series(...), variable qui en reçoit
+    un…) ; receveur inconnu : le LLM tranche. `sites` compte, par règle
+    (format, ix, ravel, freq), les occurrences réécrites ou reconnues
+    comme faux positifs (str.format, ndarray.ravel).
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.rewrites: List[str] = []
+        self.unresolved: List[str] = []
+        self.sites: Counter = Counter()
+        self.kinds: Dict[str, str] = {}  # nom → « pandas » | « numpy » | « str »
+        self._ix_handled: Set[int] = set()
+
+    # -- type du receveur ------------------------------------------------------
+
+    def _kind(self, node: cst.BaseExpression) -> Optional[str]:
+        """« pandas », « numpy », « str » ou None si on ne sait pas."""
+        if isinstance(node, cst.Name):
+            return self.kinds.get(node.value)
+        if isinstance(node, STRING_NODES):
+            return "str"
+        if isinstance(node, cst.Subscript):
+            return "pandas" if self._kind(node.value) == "pandas" else None
+        if isinstance(node, cst.Attribute):
+            if node.attr.value in NUMPY_ATTRS:
+                return "numpy"
+            if node.attr.value in PANDAS_ATTRS and self._kind(node.value) == "pandas":
+                return "pandas"
+            return None
+        if isinstance(node, cst.Call) and isinstance(node.func, cst.Attribute):
+            owner, name = node.func.value, node.func.attr.value
+            if isinstance(owner, cst.Name) and owner.value in PANDAS_ROOTS:
+                return "pandas" if name in PANDAS_FACTORIES or name.startswith("read_") else None
+            if _root_name(owner) in NUMPY_ROOTS or name in NUMPY_METHODS:
+                return "numpy"
+            if name in PANDAS_METHODS and self._kind(owner) == "pandas":
+                return "pandas"
+        return None
+
+    def _bind(self, target: cst.BaseExpression, kind: Optional[str]) -> None:
+        if isinstance(target, cst.Name):
+            if kind is None:
+                self.kinds.pop(target.value, None)
+            else:
+                self.kinds[target.value] = kind
+        elif isinstance(target, (cst.Tuple, cst.List)):
+            for el in target.elements:
+                self._bind(el.value, None)
+
+    def leave_Assign(self, original_node: cst.Assign,
+                     updated_node: cst.Assign) -> cst.Assign:
+        kind = self._kind(original_node.value)
+        for target in original_node.targets:
+            self._bind(target.target, kind)
+        return updated_node
+
+    def leave_AnnAssign(self, original_node: cst.AnnAssign,
+                        updated_node: cst.AnnAssign) -> cst.AnnAssign:
+        if original_node.value is not None:
+            self._bind(original_node.target, self._kind(original_node.value))
+        return updated_node
+
+    def visit_For(self, node: cst.For) -> None:
+        self._bind(node.target, None)  # variable de boucle : type inconnu
+
+    # -- .ix[...] → .loc[...] / .iloc[...] ---------------------------------
+
+    def visit_Subscript(self, node: cst.Subscript) -> None:
+        if isinstance(node.value, cst.Attribute) and node.value.attr.value == "ix":
+            self._ix_handled.add(id(node.value))
+
+    def leave_Attribute(self, original_node: cst.Attribute,
+                        updated_node: cst.Attribute) -> cst.BaseExpression:
+        if original_node.attr.value == "ix" and id(original_node) not in self._ix_handled:
+            self.unresolved.append(".ix")
+        return updated_node
+
+    def leave_Subscript(self, original_node: cst.Subscript,
+                        updated_node: cst.Subscript) -> cst.BaseExpression:
+        value = updated_node.value
+        if not (isinstance(value, cst.Attribute) and value.attr.value == "ix"):
+            return updated_node
+        accessor = _ix_accessor(updated_node.slice)
+        if accessor is None:
+            self.unresolved.append(".ix[...]")
+            return updated_node
+        self.rewrites.append(f".ix → .{accessor}")
+        self.sites["ix"] += 1
+        return updated_node.with_changes(value=value.with_changes(attr=cst.Name(accessor)))
+
+    # -- .ravel() → .to_numpy() ; Index.format() → .astype(str).tolist() ----
+
+    def leave_Call(self, original_node: cst.Call,
+                   updated_node: cst.Call) -> cst.BaseExpression:
+        func = updated_node.func
+        if isinstance(func, cst.Name):
+            return self._freq(updated_node, func.value)
+        if not isinstance(func, cst.Attribute):
+            return updated_node
+        name = func.attr.value
+        updated_node = self._freq(updated_node, name)
+        if name == "ravel":
+            return self._ravel(updated_node, func)
+        if name == "format":
+            return self._format(updated_node, func)
+        return updated_node
+
+    def _ravel(self, call: cst.Call, func: cst.Attribute) -> cst.BaseExpression:
+        receiver = func.value
+        kind = "numpy" if _root_name(receiver) in NUMPY_ROOTS else self._kind(receiver)
+        if kind == "numpy":
+            self.sites["ravel"] += 1
+            return call  # ndarray.ravel / np.ravel : rien de déprécié
+        if kind != "pandas" or call.args:
+            # axes.ravel(), receveur venu d'une autre cellule… : au LLM
+            self.unresolved.append(".ravel(...)")
+            return call
+        self.rewrites.append(".ravel() → .to_numpy()")
+        self.sites["ravel"] += 1
+        return call.with_changes(func=func.with_changes(attr=cst.Name("to_numpy")))
+
+    def _format(self, call: cst.Call, func: cst.Attribute) -> cst.BaseExpression:
+        kind = self._kind(func.value)
+        keywords = {a.keyword.value for a in call.args if a.keyword is not None}
+        positional = any(a.keyword is None for a in call.args)
+        index_like = not call.args or (not positional and keywords <= INDEX_FORMAT_KWARGS)
+        if kind == "str" or not index_like:
+            # "...".format(...), template.format(x) : str.format
+            self.sites["format"] += 1
+            return call
+        if kind != "pandas" or call.args:
+            self.unresolved.append(".format(...)")
+            return call
+        self.rewrites.append(".format() → .astype(str).tolist()")
+        self.sites["format"] += 1
+        as_str = cst.Call(
+            func=cst.Attribute(value=func.value, attr=cst.Name("astype")),
+            args=[cst.Arg(value=cst.Name("str"))])
+        return cst.Call(func=cst.Attribute(value=as_str, attr=cst.Name("tolist")))
+
+    # -- freq='Q' → freq='QE' ------------------------------------------------
+
+    def _freq(self, call: cst.Call, name: str) -> cst.Call:
+        """freq='Q' → 'QE', seulement pour les appels qui attendent un offset."""
+        args = list(call.args)
+        for i, arg in enumerate(args):
+            value = arg.value
+            if not (arg.keyword is not None and arg.keyword.value == "freq"
+                    and isinstance(value, cst.SimpleString)
+                    and ast.literal_eval(value.value) == "Q"):
+                continue
+            if name in FREQ_PERIOD_CALLS:
+                self.sites["freq"] += 1  # période trimestrielle : rien de déprécié
+            elif name in FREQ_OFFSET_CALLS:
+                self.rewrites.append("freq='Q' → freq='QE'")
+                self.sites["freq"] += 1
+                args[i] = arg.with_changes(value=value.with_changes(
+                    value=f"{value.prefix}{value.quote}QE{value.quote}"))
+            else:
+                self.unresolved.append(f"{name}(freq='Q')")
+        return call.with_changes(args=args)
+
+
+class CodemodResult(NamedTuple):
+    code: str
+    sites: Counter   # règle → occurrences réécrites ou écartées comme faux positifs
+
+
+def run_codemods(src: str) -> Optional[CodemodResult]:
+    """Applique les codemods à une cellule.
+
+    None si la cellule ne se parse pas ou contient un usage que seul le
+    LLM peut trancher.
+    """
+    try:
+        module = cst.parse_module(src)
+    except cst.ParserSyntaxError:
+        return None  # magics IPython, code cassé… → LLM
+    transformer = DeprecationCodemod()
+    new_module = module.visit(transformer)
+    if transformer.unresolved:
+        return None
+    return CodemodResult(new_module.code, transformer.sites)
+
+
+def apply_codemods(src: str) -> Optional[str]:
+    """Code réécrit par run_codemods, ou None."""
+    result = run_codemods(src)
+    return None if result is None else result.code
+
+
+def strip_comments(src: str) -> str:
+    """`src` sans ses commentaires (les motifs qui n'y figurent sont de faux positifs)."""
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(src).readline))
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return src
+    lines = src.split("\n")
+    for tok in reversed(tokens):
+        if tok.type == tokenize.COMMENT:
+            row, col = tok.start
+            lines[row - 1] = lines[row - 1][:col]
+    return "\n".join(lines)
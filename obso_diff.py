@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# obso_diff.py – application en mémoire d'un diff unifié à la source d'une cellule
+
+from __future__ import annotations
+
+import os
+import re
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# Lignes de contexte qu'on peut ignorer en bord de hunk (comme `patch --fuzz`)
+DIFF_FUZZ = int(os.getenv("DIFF_FUZZ", "2"))
+
+_HUNK_RE = re.compile(r"^@@+\s*(?:-(\d+)(?:,\d+)?\s+\+\d+(?:,\d+)?)?.*?@@")
+
+
+class PatchError(ValueError):
+    """Diff illisible ou hunk introuvable dans la source."""
+
+
+class Hunk(NamedTuple):
+    start: Optional[int]           # ligne (1-based) annoncée dans l'ancien texte, None si absente
+    lines: List[Tuple[str, str]]   # (" " | "-" | "+", texte sans fin de ligne)
+
+    @property
+    def old(self) -> List[str]:
+        return [text for op, text in self.lines if op != "+"]
+
+    @property
+    def new(self) -> List[str]:
+        return [text for op, text in self.lines if op != "-"]
+
+
+# ---------------------------------------------------------------------------
+# LECTURE
+# ---------------------------------------------------------------------------
+
+def parse_diff(text: str) -> List[Hunk]:
+    """Hunks d'un diff unifié, tel que le renvoie un LLM.
+
+    Tolère les blocs markdown, le texte autour du diff, les en-têtes de
+    fichier quelconques (ignorés : le diff s'applique à une cellule), les
+    compteurs faux des lignes @@ et les hunks sans ligne @@.
+    """
+    raw = [line for line in text.replace("\r\n", "\n").split("\n")
+           if not line.lstrip().startswith("```")]
+    hunks: List[Hunk] = []
+    current: Optional[Hunk] = None
+    headers = False
+    for i, line in enumerate(raw):
+        nxt = raw[i + 1] if i + 1 < len(raw) else ""
+        if line.startswith("--- ") and nxt.startswith("+++ "):
+            current, headers = None, True
+            continue
+        if line.startswith("+++ ") and headers and current is None:
+            continue
+        m = _HUNK_RE.match(line)
+        if m:
+            current = Hunk(int(m.group(1)) if m.group(1) else None, [])
+            hunks.append(current)
+            continue
+        if line.startswith("\\"):  # « \ No newline at end of file »
+            continue
+        if line[:1] in (" ", "-", "+") or (line == "" and current is not None):
+            if current is None:
+                if not headers:
+                    continue  # texte avant le diff
+                current = Hunk(None, [])
+                hunks.append(current)
+            current.lines.append((line[:1] or " ", line[1:]))
+            continue
+        current = None  # commentaire : fin du hunk
+    hunks = [h for h in hunks if any(op != " " for op, _ in h.lines)]
+    if not hunks:
+        raise PatchError("aucun hunk dans le diff")
+    return [_trim_blank_context(h) for h in hunks]
+
+
+def _trim_blank_context(hunk: Hunk) -> Hunk:
+    # une ligne vide finale est souvent la fin du message, pas du contexte
+    lines = list(hunk.lines)
+    while lines and lines[-1] == (" ", ""):
+        lines.pop()
+    return Hunk(hunk.start, lines)
+
+
+# ---------------------------------------------------------------------------
+# APPLICATION
+# ---------------------------------------------------------------------------
+
+def _normalizers():
+    yield lambda s: s.rstrip()                 # espaces de fin
+    yield lambda s: " ".join(s.split())        # indentation et espacement
+
+
+def _positions(expected: int, low: int, high: int) -> Iterator[int]:
+    """low..high, du plus proche de `expected` au plus lointain."""
+    expected = min(max(expected, low), high)
+    yield expected
+    for d in range(1, high - low + 1):
+        if expected - d >= low:
+            yield expected - d
+        if expected + d <= high:
+            yield expected + d
+
+
+def _find(lines: Sequence[str], block: Sequence[str], expected: int, low: int) -> Optional[int]:
+    if not block or len(block) > len(lines) - low:
+        return None
+    for norm in _normalizers():
+        want = [norm(line) for line in block]
+        have = [norm(line) for line in lines]
+        for pos in _positions(expected, low, len(lines) - len(block)):
+            if have[pos:pos + len(block)] == want:
+                return pos
+    return None
+
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _replacement(lines: Sequence[str], pos: int, body: Sequence[Tuple[str, str]]) -> List[str]:
+    """Lignes qui remplacent le bloc trouvé en `pos`.
+
+    Le contexte est repris de la source ; les ajouts reçoivent l'indentation
+    que le diff aurait perdue (bloc trouvé en ignorant l'espacement).
+    """
+    first = next((text for op, text in body if op != "+"), None)
+    extra = ""
+    if first is not None:
+        have, want = _indent(lines[pos]), _indent(first)
+        if have.startswith(want):
+            extra = have[len(want):]
+    out, i = [], pos
+    for op, text in body:
+        if op == " ":
+            out.append(lines[i])
+        if op != "+":
+            i += 1
+        else:
+            out.append(extra + text if text.strip() else text)
+    return out
+
+
+def _trailing_context(lines: Sequence[Tuple[str, str]]) -> int:
+    return next((i for i, (op, _) in enumerate(reversed(lines)) if op != " "), len(lines))
+
+
+def _variants(hunk: Hunk, fuzz: int) -> Iterator[Tuple[List[Tuple[str, str]], int]]:
+    """Le hunk, puis sans 1..fuzz lignes de contexte en tête et en queue."""
+    lines = hunk.lines
+    head = next((i for i, (op, _) in enumerate(lines) if op != " "), len(lines))
+    tail = _trailing_context(lines)
+    for f in range(fuzz + 1):
+        cut_head, cut_tail = min(f, head), min(f, tail)
+        if f and not (cut_head or cut_tail):
+            break
+        yield lines[cut_head:len(lines) - cut_tail], cut_head
+
+
+def apply_hunks(source: str, hunks: Sequence[Hunk], fuzz: int = DIFF_FUZZ) -> str:
+    """Applique `hunks` à `source`, dans l'ordre, avec une recherche floue.
+
+    Chaque hunk est cherché au plus près de sa ligne annoncée (décalée de
+    l'effet des hunks précédents), d'abord au caractère près hors espaces
+    de fin, puis en ignorant l'espacement, puis en retirant jusqu'à `fuzz`
+    lignes de contexte en bord. Un hunk dont le résultat est déjà présent
+    est sauté (comme `patch --forward`).
+    """
+    lines = source.split("\n")
+    offset = 0
+    low = 0  # les lignes modifiées des hunks ne se chevauchent pas
+    for n, hunk in enumerate(hunks, 1):
+        if not hunk.old and hunk.start is None:
+            raise PatchError(f"hunk {n} sans contexte ni position")
+        expected = (hunk.start - 1 + offset) if hunk.start else low
+        for body, cut in _variants(hunk, fuzz):
+            old = [text for op, text in body if op != "+"]
+            if old:
+                pos = _find(lines, old, expected + cut, low)
+            else:  # insertion pure : après la ligne annoncée
+                pos = min(max(expected + 1, low), len(lines))
+            if pos is not None:
+                new = _replacement(lines, pos, body)
+                lines[pos:pos + len(old)] = new
+                offset += len(new) - len(old)
+                # le contexte de fin peut servir au hunk suivant
+                low = pos + len(new) - _trailing_context(body)
+                break
+        else:
+            done = _find(lines, hunk.new, expected, low) if hunk.new != hunk.old else None
+            if done is None:
+                raise PatchError(f"hunk {n} introuvable dans la source")
+            low = done + len(hunk.new)
+    return "\n".join(lines)
+
+
+def apply_diff(source: str, diff_text: str, fuzz: int = DIFF_FUZZ) -> str:
+    """Source de la cellule après application du diff unifié `diff_text`."""
+    return apply_hunks(source, parse_diff(diff_text), fuzz)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# obso_discovery.py – découverte parallèle et paresseuse des notebooks
+
+from __future__ import annotations
+
+import fnmatch
+import os
+import queue
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# Dossiers jamais parcourus (en plus de .gitignore)
+DEFAULT_SKIP_DIRS = {
+    ".git", ".hg", ".svn", ".ipynb_checkpoints", "__pycache__",
+    ".venv", "venv", "node_modules", ".tox", ".nox", ".mypy_cache",
+    ".pytest_cache", "site-packages",
+}
+DISCOVERY_WORKERS = int(os.getenv("DISCOVERY_WORKERS", "8"))
+
+
+def _env_globs(name: str) -> List[str]:
+    return [g.strip() for g in os.getenv(name, "").split(",") if g.strip()]
+
+
+# ---------------------------------------------------------------------------
+# .gitignore (sous-ensemble courant : ancrage, **, dossiers, négation)
+# ---------------------------------------------------------------------------
+
+class _Rule(NamedTuple):
+    base: str          # dossier du .gitignore, relatif à la racine ("" = racine)
+    regex: re.Pattern
+    negate: bool
+    dir_only: bool
+
+
+def _glob_to_regex(pattern: str) -> str:
+    out, i = [], 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end < 0:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                out.append(pattern[i:end + 1].replace("[!", "[^"))
+                i = end + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+def parse_gitignore(path: Path, base: str) -> List[_Rule]:
+    try:
+        lines = path.read_text(encoding="utf-8", errors="replace").splitlines()
+    except OSError:
+        return []
+    rules = []
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        line = line[1:] if negate else line
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        body = _glob_to_regex(line)
+        regex = re.compile(("" if anchored else "(?:.*/)?") + body + "$")
+        rules.append(_Rule(base, regex, negate, dir_only))
+    return rules
+
+
+def is_ignored(rules: Sequence[_Rule], rel: str, is_dir: bool) -> bool:
+    ignored = False
+    for rule in rules:  # la dernière règle qui matche l'emporte
+        if rule.dir_only and not is_dir:
+            continue
+        if rule.base:
+            if not rel.startswith(rule.base + "/"):
+                continue
+            sub = rel[len(rule.base) + 1:]
+        else:
+            sub = rel
+        if rule.regex.match(sub):
+            ignored = not rule.negate
+    return ignored
+
+
+# ---------------------------------------------------------------------------
+# PARCOURS
+# ---------------------------------------------------------------------------
+
+class NotebookFinder:
+    """Trouve les .ipynb sous `root` en respectant .gitignore et des globs.
+
+    `include` / `exclude` : globs fnmatch sur le chemin relatif POSIX
+    (par défaut OBSO_INCLUDE / OBSO_EXCLUDE, séparés par des virgules).
+    """
+
+    def __init__(self, root: Path, include: Optional[Sequence[str]] = None,
+                 exclude: Optional[Sequence[str]] = None,
+                 skip_dirs: Sequence[str] = tuple(DEFAULT_SKIP_DIRS),
+                 use_gitignore: bool = True, workers: int = DISCOVERY_WORKERS):
+        self.root = Path(root).resolve()
+        self.include = list(include) if include is not None else _env_globs("OBSO_INCLUDE")
+        self.exclude = list(exclude) if exclude is not None else _env_globs("OBSO_EXCLUDE")
+        self.skip_dirs = set(skip_dirs)
+        self.use_gitignore = use_gitignore
+        self.workers = max(1, workers)
+
+    def accepts(self, path: Path) -> bool:
+        """Filtre un chemin venu d'ailleurs (git diff…) ; .gitignore non consulté."""
+        try:
+            rel = Path(path).resolve().relative_to(self.root).as_posix()
+        except ValueError:
+            return False
+        if any(part in self.skip_dirs for part in rel.split("/")[:-1]):
+            return False
+        return rel.endswith(".ipynb") and self._globs_ok(rel)
+
+    def _globs_ok(self, rel: str) -> bool:
+        if self.include and not any(fnmatch.fnmatch(rel, g) for g in self.include):
+            return False
+        return not any(fnmatch.fnmatch(rel, g) for g in self.exclude)
+
+    def _scan_dir(self, rel_dir: str, rules: Tuple[_Rule, ...]):
+        """Liste un dossier : renvoie (notebooks, sous-dossiers à parcourir)."""
+        directory = self.root / rel_dir if rel_dir else self.root
+        if self.use_gitignore and (directory / ".gitignore").is_file():
+            rules = rules + tuple(parse_gitignore(directory / ".gitignore", rel_dir))
+        files, subdirs = [], []
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return files, subdirs
+        for entry in entries:
+            rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name in self.skip_dirs or is_ignored(rules, rel, True):
+                    continue
+                if os.path.exists(os.path.join(entry.path, "pyvenv.cfg")):
+                    continue  # virtualenv
+                subdirs.append((rel, rules))
+            elif (entry.name.endswith(".ipynb") and not is_ignored(rules, rel, False)
+                  and self._globs_ok(rel)):
+                files.append(Path(entry.path))
+        return files, subdirs
+
+    def __iter__(self) -> Iterator[Path]:
+        """Produit les chemins au fil du parcours (ordre non déterministe)."""
+        results: "queue.Queue" = queue.Queue()
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="discovery")
+
+        def submit(rel_dir: str, rules: Tuple[_Rule, ...]) -> None:
+            fut = pool.submit(self._scan_dir, rel_dir, rules)
+            fut.add_done_callback(results.put)
+
+        try:
+            submit("", ())
+            pending = 1
+            while pending:
+                fut = results.get()
+                pending -= 1
+                files, subdirs = fut.result()
+                for rel_dir, rules in subdirs:
+                    submit(rel_dir, rules)
+                    pending += 1
+                yield from files
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_notebooks(root: Path, **kwargs) -> Iterator[Path]:
+    return iter(NotebookFinder(root, **kwargs))
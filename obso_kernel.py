@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# obso_kernel.py – capture des warnings côté kernel, attribués aux cellules
+
+from __future__ import annotations
+
+import functools
+import json
+import os
+import sys
+from importlib import metadata
+from typing import Dict, List, NamedTuple, Optional
+
+import nbformat
+
+from obso_cache import make_key
+
+try:  # nom de fichier que donne ipykernel au code d'une cellule
+    from ipykernel.compiler import get_file_name
+except ImportError:  # pragma: no cover - ipykernel absent côté parent
+    get_file_name = None
+
+MARKER = "\x1eOBSO-WARNING "
+
+# Code exécuté dans le kernel avant la première cellule du notebook.
+# Chaque warning est écrit sur stderr, donc dans les sorties de la cellule
+# qui l'a déclenché (ce qui survit aussi à un timeout).
+RECORDER_SRC = r'''
+import json as _obso_json, sys as _obso_sys, warnings as _obso_warnings
+
+def _obso_showwarning(message, category, filename, lineno, file=None, line=None):
+    user_ns = get_ipython().user_ns
+    frame, user_file, user_line = _obso_sys._getframe(1), None, None
+    while frame is not None:
+        if frame.f_globals is user_ns:  # code écrit dans le notebook
+            user_file, user_line = frame.f_code.co_filename, frame.f_lineno
+            break
+        frame = frame.f_back
+    _obso_sys.stderr.write(%(marker)r + _obso_json.dumps({
+        "category": category.__name__, "message": str(message),
+        "filename": filename, "lineno": lineno,
+        "user_file": user_file, "user_line": user_line}) + "\n")
+
+_obso_warnings.simplefilter("always", DeprecationWarning)
+_obso_warnings.simplefilter("always", PendingDeprecationWarning)
+_obso_warnings.simplefilter("always", FutureWarning)
+_obso_warnings.showwarning = _obso_showwarning
+del _obso_showwarning
+''' % {"marker": MARKER}
+
+
+class KernelWarning(NamedTuple):
+    """Warning observé dans le kernel."""
+    cell: int             # index de la cellule (dans nb.cells) qui l'a causé
+    line: Optional[int]   # ligne dans cette cellule (1-based)
+    category: str         # ex. "FutureWarning"
+    message: str
+    filename: str         # module qui a émis le warning (ex. pandas/...)
+
+
+def instrument(nb: nbformat.NotebookNode) -> nbformat.NotebookNode:
+    """Copie du notebook avec la cellule d'enregistrement en tête."""
+    copy = nbformat.from_dict(nb)
+    copy.cells.insert(0, nbformat.v4.new_code_cell(RECORDER_SRC))
+    return copy
+
+
+def collect(instrumented: nbformat.NotebookNode) -> List[KernelWarning]:
+    """Extrait les warnings des sorties d'un notebook instrumenté exécuté."""
+    cells = instrumented.cells[1:]
+    by_file: Dict[str, int] = {}
+    if get_file_name is not None:
+        for idx, cell in enumerate(cells):
+            if cell.cell_type == "code":
+                # le répertoire dépend du pid du kernel : seul le nom compte
+                by_file.setdefault(os.path.basename(get_file_name(cell.source)), idx)
+
+    found: List[KernelWarning] = []
+    for idx, cell in enumerate(cells):
+        for out in cell.get("outputs", []):
+            if out.get("output_type") != "stream" or out.get("name") != "stderr":
+                continue
+            for raw in out.get("text", "").split("\n"):  # pas splitlines : \x1e
+                pos = raw.find(MARKER)
+                if pos < 0:
+                    continue
+                rec = json.loads(raw[pos + len(MARKER):])
+                # une fonction définie plus haut : on remonte à sa cellule
+                owner = by_file.get(os.path.basename(rec["user_file"] or ""), idx)
+                line = rec["user_line"] if rec["user_file"] else None
+                found.append(KernelWarning(owner, line, rec["category"],
+                                           rec["message"], rec["filename"]))
+    return found
+
+
+# ---------------------------------------------------------------------------
+# CLÉ DU CACHE D'EXÉCUTION
+# ---------------------------------------------------------------------------
+
+@functools.lru_cache(maxsize=None)
+def environment_fingerprint() -> str:
+    """Interpréteur + toutes les distributions installées (nom==version)."""
+    dists = sorted({f"{(d.metadata['Name'] or '').lower()}=={d.version}"
+                    for d in metadata.distributions()})
+    return make_key(sys.version, *dists)
+
+
+@functools.lru_cache(maxsize=None)
+def _kernel_argv(name: str) -> str:
+    try:
+        from jupyter_client.kernelspec import KernelSpecManager
+        return json.dumps(KernelSpecManager().get_kernel_spec(name).argv)
+    except Exception:  # spec introuvable : le nom seul fera foi
+        return ""
+
+
+def execution_key(nb: nbformat.NotebookNode) -> str:
+    """Ce dont dépendent les warnings d'une exécution : code, kernel, environnement.
+
+    Le texte markdown, les sorties et les métadonnées de cellule n'y entrent
+    pas ; la suite des types de cellules, si (les warnings sont indexés par
+    position dans nb.cells).
+    """
+    kernel = (nb.metadata.get("kernelspec") or {}).get("name", "python3")
+    layout = "".join(cell.cell_type[0] for cell in nb.cells)
+    sources = [cell.source for cell in nb.cells if cell.cell_type == "code"]
+    return make_key(RECORDER_SRC, kernel, _kernel_argv(kernel), environment_fingerprint(),
+                    layout, *sources)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# obso_kernel_pool.py – kernels pré-chauffés, réutilisés d'un notebook à l'autre
+
+from __future__ import annotations
+
+import asyncio
+import os
+from multiprocessing import util
+from typing import Dict, Optional, Sequence
+
+import nbformat
+from nbclient import NotebookClient
+
+# ---------------------------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------------------------
+
+# Modules importés une fois au démarrage du kernel (absents : ignorés)
+KERNEL_PRELOAD = [m.strip() for m in os.getenv(
+    "KERNEL_PRELOAD", "numpy,pandas,matplotlib.pyplot").split(",") if m.strip()]
+KERNEL_MAX_USES = int(os.getenv("KERNEL_MAX_USES", "25"))           # notebooks par kernel
+KERNEL_MAX_GROWTH_MB = int(os.getenv("KERNEL_MAX_GROWTH_MB", "512"))  # RSS au-delà du démarrage
+KERNEL_STARTUP_TIMEOUT = int(os.getenv("KERNEL_STARTUP_TIMEOUT", "60"))
+
+# Exécuté une fois par kernel : préchargement puis état de référence, que
+# reset() restaure avant chaque notebook (espace de noms vidé, cwd, sys.path,
+# environnement, filtres et registres de warnings, figures, modules locaux).
+SETUP_SRC = r'''
+import importlib as _importlib, sys as _sys, types as _types
+
+for _name in %(preload)r:
+    try:
+        _importlib.import_module(_name)
+    except Exception:
+        pass
+
+_pool = _types.ModuleType("_obso_pool")
+exec("""
+import gc, os, sys, warnings
+from IPython import get_ipython
+
+_prefixes = tuple({sys.prefix, sys.base_prefix, sys.exec_prefix})
+baseline = (os.getcwd(), list(sys.path), dict(os.environ),
+            list(warnings.filters), set(sys.modules))
+
+def _local(module):
+    path = getattr(module, "__file__", None) or ""
+    return bool(path) and not path.startswith(_prefixes)
+
+def reset():
+    cwd, path, env, filters, modules = baseline
+    get_ipython().reset(new_session=False)
+    os.chdir(cwd)
+    sys.path[:] = path
+    os.environ.clear()
+    os.environ.update(env)
+    # modules du notebook (fichiers hors de l'environnement) : réimportés au besoin
+    for name in [n for n in sys.modules if n not in modules]:
+        try:
+            if _local(sys.modules[name]):
+                del sys.modules[name]
+        except Exception:
+            pass
+    warnings.filters[:] = filters
+    warnings._filters_mutated()
+    for module in list(sys.modules.values()):
+        try:
+            registry = getattr(module, "__warningregistry__", None)
+        except Exception:
+            continue
+        if isinstance(registry, dict):
+            registry.clear()
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    if pyplot is not None:
+        pyplot.close("all")
+    gc.collect()
+""", _pool.__dict__)
+_sys.modules["_obso_pool"] = _pool
+del _importlib, _sys, _types, _name, _pool
+'''
+RESET_SRC = "__import__('_obso_pool').reset()"
+
+
+def _rss(pid: Optional[int]) -> int:
+    """Mémoire résidente d'un processus (octets) ; 0 hors Linux."""
+    try:
+        with open(f"/proc/{pid}/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, TypeError):
+        return 0
+
+
+# ---------------------------------------------------------------------------
+# KERNEL RÉUTILISABLE
+# ---------------------------------------------------------------------------
+
+class WarmKernel:
+    """Un kernel démarré et préchauffé une fois, remis à zéro entre deux notebooks.
+
+    Il est recyclé (arrêté, puis redémarré au besoin) après `max_uses`
+    notebooks, quand sa mémoire dépasse celle du démarrage de
+    `max_growth_mb`, ou après un délai dépassé ou une erreur d'exécution.
+    """
+
+    def __init__(self, kernel_name: str, preload: Sequence[str] = KERNEL_PRELOAD,
+                 max_uses: int = KERNEL_MAX_USES, max_growth_mb: int = KERNEL_MAX_GROWTH_MB):
+        self.kernel_name = kernel_name
+        self.preload = list(preload)
+        self.max_uses = max(1, max_uses)
+        self.max_growth = max_growth_mb * 1024 * 1024
+        self.km = None
+        self.kc = None
+        self.uses = 0
+        self.baseline_rss = 0
+        self.starts = 0
+
+    @property
+    def pid(self) -> Optional[int]:
+        provisioner = getattr(self.km, "provisioner", None)
+        return getattr(provisioner, "pid", None)
+
+    async def _run_silent(self, code: str) -> None:
+        reply = await self.kc.execute_interactive(
+            code, silent=True, store_history=False, timeout=KERNEL_STARTUP_TIMEOUT,
+            output_hook=lambda msg: None)
+        if reply["content"]["status"] != "ok":
+            raise RuntimeError(f"kernel setup failed: {reply['content'].get('evalue')}")
+
+    async def start(self) -> None:
+        from jupyter_client.manager import AsyncKernelManager
+        self.km = AsyncKernelManager(kernel_name=self.kernel_name)
+        await self.km.start_kernel()
+        self.kc = self.km.client()
+        self.kc.start_channels()
+        await self.kc.wait_for_ready(timeout=KERNEL_STARTUP_TIMEOUT)
+        await self._run_silent(SETUP_SRC % {"preload": self.preload})
+        self.uses = 0
+        self.starts += 1
+        self.baseline_rss = _rss(self.pid)
+
+    def worn(self) -> bool:
+        rss = _rss(self.pid)
+        return self.uses >= self.max_uses or bool(rss and rss - self.baseline_rss > self.max_growth)
+
+    async def execute(self, nb: nbformat.NotebookNode, timeout: int) -> None:
+        """Exécute `nb` en place (sorties ajoutées aux cellules), comme NotebookClient."""
+        if self.km is not None and self.uses:
+            try:
+                await self._run_silent(RESET_SRC)
+            except Exception:
+                await self.shutdown()
+        if self.km is None:
+            await self.start()
+        self.uses += 1
+        client = NotebookClient(nb, km=self.km, timeout=timeout, allow_errors=True)
+        client.kc = self.kc  # client déjà prêt : pas de nouvelle connexion
+        try:
+            await asyncio.wait_for(client.async_execute(), timeout)
+        except BaseException:
+            await self.shutdown()  # kernel peut-être encore occupé : on ne le réutilise pas
+            raise
+        if self.worn():
+            await self.shutdown()
+
+    async def shutdown(self) -> None:
+        if self.kc is not None:
+            self.kc.stop_channels()
+        if self.km is not None:
+            try:
+                await self.km.shutdown_kernel(now=True)
+            except Exception:
+                pass
+        self.km = self.kc = None
+
+
+class KernelPool:
+    """Kernels chauds d'un processus, un par kernelspec, sur une boucle persistante.
+
+    Les canaux zmq sont liés à leur boucle d'événements : elle est gardée
+    d'un notebook à l'autre au lieu d'un asyncio.run() par exécution.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.kernels: Dict[str, WarmKernel] = {}
+
+    def execute(self, nb: nbformat.NotebookNode, timeout: int) -> None:
+        name = (nb.metadata.get("kernelspec") or {}).get("name", "python3")
+        kernel = self.kernels.setdefault(name, WarmKernel(name))
+        self.loop.run_until_complete(kernel.execute(nb, timeout))
+
+    def close(self) -> None:
+        for kernel in self.kernels.values():
+            self.loop.run_until_complete(kernel.shutdown())
+        self.kernels.clear()
+        self.loop.close()
+
+
+_POOL: Optional[KernelPool] = None
+
+
+def get_pool() -> KernelPool:
+    """Pool du processus courant (un par worker), arrêté à la sortie du processus."""
+    global _POOL
+    if _POOL is None:
+        _POOL = KernelPool()
+        # Finalize passe aussi à la sortie des workers multiprocessing (pas atexit)
+        util.Finalize(None, _POOL.close, exitpriority=10)
+    return _POOL
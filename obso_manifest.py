@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# obso_manifest.py – manifeste de hash pour le mode incrémental
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from obso_cache import make_key
+
+MANIFEST_SCHEMA = 1
+
+
+def _git(root: Path, *args: str) -> Optional[str]:
+    """Lance git dans `root` ; None si git est absent ou échoue."""
+    try:
+        res = subprocess.run(["git", "-C", str(root), *args],
+                             capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return res.stdout
+
+
+def head_commit(root: Path) -> Optional[str]:
+    out = _git(root, "rev-parse", "HEAD")
+    return out.strip() if out else None
+
+
+def cell_hash(src: str) -> str:
+    return make_key(src)[:16]
+
+
+def file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+class Manifest:
+    """Hash par notebook et par cellule, valables pour une version des règles.
+
+    Format JSON : {schema, rules_version, commit, notebooks: {chemin relatif:
+    {hash, cells: [hash de cellule, ...], retry, patched}}}. `retry` marque un
+    notebook dont des cellules ont échoué côté LLM : il est repris au run
+    suivant même s'il n'a pas changé. `patched` marque un notebook corrigé par
+    le run : `hash` est celui de la version corrigée, qui doit encore arriver
+    sur la branche (PR du bot). Tant que le fichier du dépôt n'a pas ce hash,
+    le notebook est repris à chaque run (le cache LLM rend la reprise quasi
+    gratuite) : une PR écrasée ou pas encore fusionnée ne perd pas ses
+    corrections.
+    """
+
+    def __init__(self, path: Path, root: Path, rules_version: str):
+        self.path = path
+        self.root = root
+        self.rules_version = rules_version
+        self.commit: Optional[str] = None
+        self.notebooks: Dict[str, Dict] = {}
+        self.rules_changed = True
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if (data.get("schema") != MANIFEST_SCHEMA
+                or data.get("rules_version") != self.rules_version):
+            return  # règles modifiées : on repart de zéro
+        self.rules_changed = False
+        self.commit = data.get("commit")
+        self.notebooks = data.get("notebooks", {})
+
+    def _rel(self, nb_path: Path) -> str:
+        return nb_path.resolve().relative_to(self.root).as_posix()
+
+    # -- sélection ----------------------------------------------------------
+
+    def changed_notebooks(self) -> Optional[List[Path]]:
+        """Notebooks modifiés depuis le dernier commit traité, plus ceux à retenter.
+
+        None = scan complet nécessaire (pas de manifeste, règles changées,
+        commit inconnu de git, ex. clone superficiel).
+        """
+        if self.rules_changed or not self.commit:
+            return None
+        diff = _git(self.root, "diff", "-z", "--name-only", "--relative",
+                    self.commit, "--", "*.ipynb")
+        untracked = _git(self.root, "ls-files", "-z", "--others", "--exclude-standard",
+                         "--", "*.ipynb")
+        if diff is None or untracked is None:
+            return None
+        names: Set[str] = set(filter(None, (diff + untracked).split("\0")))
+        for name in names:
+            if not (self.root / name).exists():
+                self.notebooks.pop(name, None)  # notebook supprimé
+        changed = {name for name in names
+                   if (self.root / name).exists() and not self.is_known_notebook(self.root / name)}
+        for name, entry in self.notebooks.items():
+            path = self.root / name
+            if entry.get("patched") and path.exists() and self.is_known_notebook(path):
+                del entry["patched"]  # la correction est sur la branche
+        return [self.root / name for name in sorted(changed | set(self.pending_retry()))]
+
+    def pending_retry(self) -> List[str]:
+        """Notebooks (chemins relatifs) à reprendre : échec LLM ou correction non fusionnée."""
+        return sorted(name for name, entry in self.notebooks.items()
+                      if (self.root / name).exists()
+                      and (entry.get("retry") or (entry.get("patched")
+                                                  and not self.is_known_notebook(self.root / name))))
+
+    def is_known_notebook(self, nb_path: Path) -> bool:
+        entry = self.notebooks.get(self._rel(nb_path))
+        return bool(entry) and entry["hash"] == file_hash(nb_path)
+
+    def is_known_cell(self, nb_path: Path, src: str) -> bool:
+        entry = self.notebooks.get(self._rel(nb_path))
+        return bool(entry) and cell_hash(src) in entry["cells"]
+
+    # -- mise à jour --------------------------------------------------------
+
+    def record(self, nb_path: Path, cell_sources: Iterable[str], retry: bool = False,
+               patched: bool = False) -> None:
+        """Mémorise l'état (après correction) d'un notebook traité.
+
+        `cell_sources` omet les cellules en échec ; `retry` les signale pour
+        que le notebook soit repris au prochain run incrémental. `patched` :
+        le notebook a été réécrit, il reste à reprendre tant que la version
+        corrigée n'est pas celle du dépôt.
+        """
+        entry = {
+            "hash": file_hash(nb_path),
+            "cells": [cell_hash(src) for src in cell_sources],
+        }
+        if retry:
+            entry["retry"] = True
+        if patched:
+            entry["patched"] = True
+        self.notebooks[self._rel(nb_path)] = entry
+
+    def save(self, commit: Optional[str]) -> None:
+        self.commit = commit
+        data = {
+            "schema": MANIFEST_SCHEMA,
+            "rules_version": self.rules_version,
+            "commit": commit,
+            "notebooks": self.notebooks,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
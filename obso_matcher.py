@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# obso_matcher.py – détection multi-règles : préfiltre littéral, puis regex des seules candidates
+
+from __future__ import annotations
+
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+try:  # Python 3.11+
+    import re._parser as _sre_parse
+    from re._constants import LITERAL, SUBPATTERN
+except ImportError:  # pragma: no cover - Python < 3.11
+    import sre_parse as _sre_parse
+    from sre_constants import LITERAL, SUBPATTERN
+
+
+class RuleMatch(NamedTuple):
+    rule: str    # identifiant de la règle = motif de DEPRECATED_MAP
+    start: int
+    end: int
+
+
+def required_literal(pattern: str) -> str:
+    """Plus long littéral que toute occurrence de `pattern` contient ('' si aucun).
+
+    Seules les suites de caractères littéraux du niveau principal (groupes
+    simples compris) comptent : « \\.read_csv\\([^)]*\\bsep\\b » donne
+    « .read_csv( ». Une alternative au premier niveau n'en garantit aucun.
+    """
+    best, run = "", []
+
+    def walk(items) -> None:
+        nonlocal best, run
+        for op, arg in items:
+            if op is LITERAL:
+                run.append(chr(arg))
+                continue
+            if op is SUBPATTERN:
+                walk(arg[-1])
+                continue
+            if len(run) > len(best):
+                best = "".join(run)
+            run = []
+
+    try:
+        walk(_sre_parse.parse(pattern))
+    except re.error:
+        return ""
+    if len(run) > len(best):
+        best = "".join(run)
+    return best
+
+
+class RuleMatcher:
+    """Détecte les règles d'une table, pour un coût à peu près constant par règle.
+
+    Chaque règle a sa regex compilée et son littéral obligatoire (`ravel`,
+    `.format(`, `freq=`…). Une cellule est d'abord passée au préfiltre :
+    une recherche de sous-chaîne (str.find) par littéral distinct. Seules
+    les règles dont le littéral est présent sont confirmées par leur regex.
+    Les règles sans littéral exploitable sont toujours essayées.
+    """
+
+    def __init__(self, rules: Dict[str, str], flags: int = re.IGNORECASE):
+        self.rules = dict(rules)
+        self._ids = list(self.rules)
+        self._order = {rule: i for i, rule in enumerate(self._ids)}
+        self._compiled = {rule: re.compile(rule, flags) for rule in self._ids}
+        self._fold = bool(flags & re.IGNORECASE)
+        self._by_literal: Dict[str, List[str]] = {}
+        self._always: List[str] = []
+        for rule in self._ids:
+            literal = required_literal(rule)
+            if not literal:
+                self._always.append(rule)
+                continue
+            key = literal.casefold() if self._fold else literal
+            self._by_literal.setdefault(key, []).append(rule)
+
+    def candidates(self, src: str) -> List[str]:
+        """Règles dont le littéral apparaît dans `src` (à confirmer par leur regex)."""
+        text = src.casefold() if self._fold else src
+        found = list(self._always)
+        for literal, rules in self._by_literal.items():
+            if literal in text:
+                found.extend(rules)
+        return found
+
+    def scan(self, src: str) -> List[RuleMatch]:
+        """Toutes les occurrences (règle, début, fin), dans l'ordre du texte.
+
+        Comme avec une seule alternative : à position égale la règle la plus
+        haute de la table l'emporte, et les occurrences ne se chevauchent pas.
+        """
+        found = [RuleMatch(rule, m.start(), m.end())
+                 for rule in self.candidates(src)
+                 for m in self._compiled[rule].finditer(src)]
+        found.sort(key=lambda m: (m.start, self._order[m.rule]))
+        out: List[RuleMatch] = []
+        for m in found:
+            if not out or m.start >= out[-1].end:
+                out.append(m)
+        return out
+
+    def search(self, src: str) -> Optional[RuleMatch]:
+        """Première occurrence, ou None."""
+        matches = self.scan(src)
+        return matches[0] if matches else None
+
+    def rules_hit(self, src: str) -> Dict[str, str]:
+        """Sous-table des règles présentes dans `src` (ordre de la table)."""
+        hit = {m.rule for m in self.scan(src)}
+        return {rule: self.rules[rule] for rule in self._ids if rule in hit}
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# obso_metrics.py – chronométrage par étape, compteurs et export en fin de run
+
+from __future__ import annotations
+
+import bisect
+import contextlib
+import json
+import math
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from obso_cache import CACHE_DIR
+from obso_nbio import atomic_write
+
+# ---------------------------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------------------------
+
+# Rapport JSON et fichier texte Prometheus (collecteur « textfile » de
+# node_exporter), réécrits à la fin de chaque run. « {agent} » est remplacé
+# par le nom de l'agent (static, dyn) ; chaîne vide = désactivé.
+METRICS_JSON = os.getenv("OBSO_METRICS_JSON", str(CACHE_DIR / "run-{agent}.json"))
+METRICS_PROM = os.getenv("OBSO_METRICS_PROM", str(CACHE_DIR / "obso_{agent}.prom"))
+
+# Bornes des histogrammes de latence (secondes), de la lecture d'une cellule
+# à un appel LLM lent
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+COUNTER_HELP = {
+    "llm_requests_total": "Requêtes envoyées au LLM",
+    "llm_errors_total": "Requêtes LLM en échec",
+    "llm_retries_total": "Cellules renvoyées seules après un lot invalide",
+    "llm_backoff_total": "Relances après erreur passagère (reason=throttled|transient)",
+    "llm_breaker_open_total": "Ouvertures du disjoncteur LLM",
+    "llm_aborted_total": "Réponses LLM interrompues (reason=fence|prose|diverged|truncated)",
+    "llm_tokens_total": "Tokens consommés (kind=prompt|completion)",
+    "cache_lookups_total": "Consultations du cache de corrections (result=hit|miss)",
+    "cells_total": "Cellules signalées par étape finale",
+    "cells_deduplicated_total": "Copies de cellules corrigées sans nouvel appel",
+    "exec_cache_total": "Exécutions de notebooks évitées ou non (result=hit|miss)",
+    "verify_total": "Corrections rejouées dans le kernel (result=accepted|rejected|skipped)",
+    "notebooks_total": "Notebooks traités (result=read|executed|patched|worker-failure)",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Histogramme cumulatif à bornes fixes (+ échantillons pour les quantiles)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.samples: List[float] = []
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.samples.append(value)
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return len(self.samples)
+
+    def quantile(self, q: float) -> float:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        out, total = [], 0
+        for bound, n in zip(list(self.buckets) + [math.inf], self.counts):
+            total += n
+            out.append(("+Inf" if bound == math.inf else repr(bound), total))
+        return out
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"'))
+                    for k, v in labels)
+    return "{" + body + "}"
+
+
+# ---------------------------------------------------------------------------
+# REGISTRE
+# ---------------------------------------------------------------------------
+
+class Metrics:
+    """Latences par étape et compteurs d'un run, exportables en JSON et Prometheus."""
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self.started = time.time()
+        self.stages: Dict[str, Histogram] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self.stages.setdefault(stage, Histogram()).observe(seconds)
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Chronomètre le bloc, qu'il se termine normalement ou non."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        series = self.counters.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def count_usage(self, resp, prompt_chars: int) -> None:
+        """Tokens d'une réponse langchain ; estimation (≈ 4 car./token) à défaut."""
+        usage = getattr(resp, "usage_metadata", None) or {}
+        meta = (getattr(resp, "response_metadata", None) or {}).get("token_usage") or {}
+        prompt = usage.get("input_tokens") or meta.get("prompt_tokens")
+        completion = usage.get("output_tokens") or meta.get("completion_tokens")
+        if prompt is None:
+            prompt = prompt_chars // 4 + 1
+        if completion is None:
+            completion = len(getattr(resp, "content", "") or "") // 4 + 1
+        self.inc("llm_tokens_total", prompt, kind="prompt")
+        self.inc("llm_tokens_total", completion, kind="completion")
+
+    # -- export ------------------------------------------------------------
+
+    def report(self) -> Dict[str, object]:
+        return {
+            "agent": self.agent,
+            "started": self.started,
+            "duration_seconds": round(time.time() - self.started, 3),
+            "stages": {
+                name: {"count": h.count, "sum": round(h.sum, 6),
+                       "p50": round(h.quantile(0.5), 6), "p95": round(h.quantile(0.95), 6),
+                       "max": round(max(h.samples), 6) if h.samples else 0.0,
+                       "buckets": dict(h.cumulative())}
+                for name, h in sorted(self.stages.items())},
+            "counters": {
+                name: {_fmt_labels(labels) or "total": value
+                       for labels, value in sorted(series.items())}
+                for name, series in sorted(self.counters.items())},
+        }
+
+    def prometheus(self) -> str:
+        agent = (("agent", self.agent),)
+        lines = [
+            "# HELP obso_stage_seconds Durée des étapes du pipeline",
+            "# TYPE obso_stage_seconds histogram",
+        ]
+        for name, h in sorted(self.stages.items()):
+            base = agent + (("stage", name),)
+            for le, n in h.cumulative():
+                lines.append(f"obso_stage_seconds_bucket{_fmt_labels(base + (('le', le),))} {n}")
+            lines.append(f"obso_stage_seconds_sum{_fmt_labels(base)} {h.sum:.6f}")
+            lines.append(f"obso_stage_seconds_count{_fmt_labels(base)} {h.count}")
+        for name, series in sorted(self.counters.items()):
+            metric = f"obso_{name}"
+            lines.append(f"# HELP {metric} {COUNTER_HELP.get(name, name)}")
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{metric}{_fmt_labels(agent + labels)} {value:g}")
+        lines += [
+            "# HELP obso_run_duration_seconds Durée totale du dernier run",
+            "# TYPE obso_run_duration_seconds gauge",
+            f"obso_run_duration_seconds{_fmt_labels(agent)} {time.time() - self.started:.3f}",
+            "# HELP obso_run_timestamp_seconds Début du dernier run (epoch)",
+            "# TYPE obso_run_timestamp_seconds gauge",
+            f"obso_run_timestamp_seconds{_fmt_labels(agent)} {self.started:.0f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def export(self, json_path: Optional[str] = METRICS_JSON,
+               prom_path: Optional[str] = METRICS_PROM) -> List[Path]:
+        """Écrit les fichiers demandés (atomiquement) ; renvoie leurs chemins."""
+        written = []
+        for path, render in ((json_path, lambda: json.dumps(self.report(), indent=2) + "\n"),
+                             (prom_path, self.prometheus)):
+            if not path:
+                continue
+            path = Path(path.format(agent=self.agent))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(path, render())
+            written.append(path)
+        return written
+
+    def summary(self) -> str:
+        """Une ligne : temps cumulé et p95 des étapes, par ordre de coût."""
+        parts = [f"{name} {h.sum:.2f}s (p95 {h.quantile(0.95) * 1000:.0f} ms)"
+                 for name, h in sorted(self.stages.items(), key=lambda kv: -kv[1].sum)]
+        return ", ".join(parts) or "—"
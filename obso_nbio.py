@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# obso_nbio.py – lecture rapide et réécriture minimale des cellules d'un .ipynb
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import re
+import stat
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+_DECODER = json.JSONDecoder()
+_WS = re.compile(r"\s*")
+# prochain caractère structurant pour sauter une valeur sans la décoder
+_STRUCT = re.compile(r'["\[\]{}]')
+
+
+class CellSource(NamedTuple):
+    index: int    # position dans nb.cells
+    source: str
+
+
+class _Skipper:
+    """Parcours minimal du JSON : ne décode que les petites valeurs utiles."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def ws(self, pos: int) -> int:
+        return _WS.match(self.text, pos).end()
+
+    def expect(self, pos: int, char: str) -> int:
+        pos = self.ws(pos)
+        if self.text[pos] != char:
+            raise ValueError(f"'{char}' attendu à la position {pos}")
+        return pos + 1
+
+    def decode(self, pos: int) -> Tuple[Any, int]:
+        return _DECODER.raw_decode(self.text, self.ws(pos))
+
+    def skip_string(self, pos: int) -> int:
+        """`pos` pointe sur le guillemet ouvrant ; renvoie la position après le fermant."""
+        text = self.text
+        end = pos
+        while True:
+            end = text.index('"', end + 1)
+            backslashes = 0
+            while text[end - 1 - backslashes] == "\\":
+                backslashes += 1
+            if backslashes % 2 == 0:
+                return end + 1
+
+    def skip_value(self, pos: int) -> int:
+        pos = self.ws(pos)
+        char = self.text[pos]
+        if char == '"':
+            return self.skip_string(pos)
+        if char not in "[{":
+            return self.decode(pos)[1]  # nombre, true/false/null
+        depth = 0
+        while True:
+            m = _STRUCT.search(self.text, pos)
+            if m is None:
+                raise ValueError("JSON tronqué")
+            char = m.group()
+            if char == '"':
+                pos = self.skip_string(m.start())
+                continue
+            depth += 1 if char in "[{" else -1
+            pos = m.end()
+            if depth == 0:
+                return pos
+
+
+def _walk_object(sk: _Skipper, pos: int, handler) -> int:
+    """Applique handler(clé, pos_valeur) -> pos_suivante à chaque membre d'un objet."""
+    pos = sk.ws(sk.expect(pos, "{"))
+    if sk.text[pos] == "}":
+        return pos + 1
+    while True:
+        key, pos = sk.decode(pos)
+        pos = sk.ws(handler(key, sk.expect(pos, ":")))
+        if sk.text[pos] == "}":
+            return pos + 1
+        pos = sk.expect(pos, ",")
+
+
+def _scan(text: str) -> Tuple[List[CellSource], Dict[int, Tuple[int, int]], int]:
+    """Renvoie (cellules de code, span de chaque valeur « source », nbformat)."""
+    sk = _Skipper(text)
+    cells: List[CellSource] = []
+    spans: Dict[int, Tuple[int, int]] = {}
+    version = {"nbformat": 4}
+
+    def on_top(key: str, pos: int) -> int:
+        if key == "cells":
+            return _read_cells(sk, pos, cells, spans)
+        if key == "nbformat":
+            version["nbformat"], pos = sk.decode(pos)
+            return pos
+        return sk.skip_value(pos)
+
+    _walk_object(sk, 0, on_top)
+    return cells, spans, version["nbformat"]
+
+
+def _read_cells(sk: _Skipper, pos: int, cells: List[CellSource],
+                spans: Dict[int, Tuple[int, int]]) -> int:
+    pos = sk.expect(pos, "[")
+    index = 0
+    pos = sk.ws(pos)
+    if sk.text[pos] == "]":
+        return pos + 1
+    while True:
+        fields = {}
+
+        def on_cell(key: str, vpos: int) -> int:
+            if key in ("cell_type", "source"):
+                start = sk.ws(vpos)
+                fields[key], vpos = sk.decode(start)
+                fields[key + "_span"] = (start, vpos)
+                return vpos
+            return sk.skip_value(vpos)
+
+        pos = _walk_object(sk, pos, on_cell)
+        if fields.get("cell_type") == "code":
+            src = fields.get("source", "")
+            cells.append(CellSource(index, "".join(src) if isinstance(src, list) else src))
+            if "source_span" in fields:
+                spans[index] = fields["source_span"]
+        index += 1
+        pos = sk.ws(pos)
+        if sk.text[pos] == "]":
+            return pos + 1
+        pos = sk.expect(pos, ",")
+
+
+def read_code_cells(nb_path: Path) -> List[CellSource]:
+    """Sources des cellules de code, sans matérialiser outputs ni métadonnées.
+
+    Les notebooks au format < 4 passent par nbformat (conversion v4).
+    """
+    text = Path(nb_path).read_text(encoding="utf-8")
+    cells, _, version = _scan(text)
+    if version < 4:
+        import nbformat  # rare : inutile pour le chemin rapide
+        nb = nbformat.reads(text, as_version=4)
+        return [CellSource(i, c.source) for i, c in enumerate(nb.cells) if c.cell_type == "code"]
+    return cells
+
+
+# ---------------------------------------------------------------------------
+# ÉCRITURE : remplacement des seules valeurs « source »
+# ---------------------------------------------------------------------------
+
+def _encode_source(old: str, code: str, key_indent: str) -> str:
+    """Encode `code` dans la forme de l'ancienne valeur JSON (liste ou chaîne)."""
+    if not old.startswith("["):
+        return json.dumps(code, ensure_ascii=False)
+    lines = code.splitlines(keepends=True)  # même découpe que nbformat
+    if not lines:
+        return "[]"
+    lead = _WS.match(old, 1).group()
+    tail = old[len(old.rstrip("]").rstrip()):-1]
+    if old == "[]":  # liste vide : indentation de nbformat (indent=1)
+        lead, tail = "\n" + key_indent + " ", "\n" + key_indent
+    elif not lead:  # liste compacte
+        return json.dumps(lines, ensure_ascii=False)
+    sep = "," + lead
+    return "[" + lead + sep.join(json.dumps(l, ensure_ascii=False) for l in lines) + tail + "]"
+
+
+def atomic_write(path: Path, data: str) -> None:
+    """Écrit via un fichier temporaire du même dossier puis os.replace."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as fh:
+            fh.write(data)
+        try:
+            os.chmod(tmp, stat.S_IMODE(path.stat().st_mode))
+        except OSError:
+            pass
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+def patch_cell_sources(nb_path: Path, patches: Dict[int, str]) -> None:
+    """Remplace le source des cellules `patches` (index → code) dans le fichier.
+
+    Tous les autres octets (outputs, métadonnées, mise en forme) restent
+    identiques ; l'écriture est atomique.
+    """
+    text = Path(nb_path).read_text(encoding="utf-8")
+    _, spans, version = _scan(text)
+    if version < 4 or not set(patches) <= set(spans):
+        # format ancien ou cellule inattendue : réécriture complète
+        import nbformat
+        nb = nbformat.reads(text, as_version=4)
+        for index, code in patches.items():
+            nb.cells[index]["source"] = code
+        atomic_write(nb_path, nbformat.writes(nb) + "\n")
+        return
+
+    pieces = []
+    last = 0
+    for index in sorted(patches):
+        start, end = spans[index]
+        line_start = text.rfind("\n", 0, start) + 1
+        key_indent = _WS.match(text, line_start).group().strip("\r\n")
+        pieces += [text[last:start], _encode_source(text[start:end], patches[index], key_indent)]
+        last = end
+    pieces.append(text[last:])
+    atomic_write(nb_path, "".join(pieces))
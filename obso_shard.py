@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# obso_shard.py – répartition déterministe des notebooks entre jobs CI, puis fusion
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from obso_manifest import cell_hash
+from obso_nbio import atomic_write, patch_cell_sources, read_code_cells
+
+SHARD_SCHEMA = 1
+BALANCE_MODES = ("hash", "size", "runtime")
+
+
+class Shard(NamedTuple):
+    index: int   # 1..count, comme dans une matrice GitHub Actions
+    count: int
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+
+def parse_shard(text: str) -> Shard:
+    """« i/N » → Shard(i, N), avec 1 <= i <= N."""
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"shard invalide {text!r} (attendu : i/N)") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"shard invalide {text!r} (1 <= i <= N)")
+    return Shard(index, count)
+
+
+def stable_bucket(rel: str, count: int) -> int:
+    """Shard (1..count) d'un chemin relatif : identique sur toutes les machines."""
+    return int(hashlib.sha256(rel.encode("utf-8")).hexdigest()[:16], 16) % count + 1
+
+
+def _balanced(weights: Dict[str, float], count: int) -> Dict[str, int]:
+    """Plus gros d'abord vers le shard le moins chargé (LPT), à égalité par chemin."""
+    heap = [(0.0, shard) for shard in range(1, count + 1)]
+    assignment = {}
+    for rel in sorted(weights, key=lambda r: (-weights[r], r)):
+        load, shard = heapq.heappop(heap)
+        assignment[rel] = shard
+        heapq.heappush(heap, (load + weights[rel], shard))
+    return assignment
+
+
+def select_shard(nb_paths: Iterable[Path], root: Path, shard: Shard, balance: str = "hash",
+                 timings: Optional[Dict[str, float]] = None) -> Iterator[Path]:
+    """Notebooks de `nb_paths` qui reviennent à `shard`.
+
+    « hash » filtre au fil de l'eau. « size » et « runtime » ont besoin de
+    la liste complète (ordre de découverte indifférent) : poids = taille du
+    fichier, ou durée du dernier run (médiane des durées connues à défaut).
+    """
+    root = Path(root)
+    if balance == "hash":
+        for p in nb_paths:
+            if stable_bucket(p.relative_to(root).as_posix(), shard.count) == shard.index:
+                yield p
+        return
+
+    paths = {p.relative_to(root).as_posix(): p for p in nb_paths}
+    if balance == "runtime" and timings:
+        known = sorted(timings[rel] for rel in paths if rel in timings)
+        default = known[len(known) // 2] if known else 1.0
+        weights = {rel: timings.get(rel, default) for rel in paths}
+    else:
+        weights = {rel: float(os.path.getsize(p)) for rel, p in paths.items()}
+    for rel, index in sorted(_balanced(weights, shard.count).items()):
+        if index == shard.index:
+            yield paths[rel]
+
+
+def load_timings(path: Path) -> Dict[str, float]:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+# ---------------------------------------------------------------------------
+# RÉSULTATS PARTIELS
+# ---------------------------------------------------------------------------
+
+class ShardResult:
+    """Cellules corrigées par un shard, avec le hash de leur source d'origine.
+
+    Format JSON : {schema, shard, root, stages, notebooks: {chemin relatif:
+    {seconds, cells: {index: {before, code}}}}}.
+    """
+
+    def __init__(self, root: Path, shard: Optional[Shard] = None):
+        self.root = Path(root)
+        self.shard = shard
+        self.notebooks: Dict[str, Dict] = {}
+        self.stages: Dict[str, int] = {}
+
+    def record(self, nb_path: Path, before: Dict[int, str], patched: Dict[int, str],
+               seconds: float) -> None:
+        rel = Path(nb_path).resolve().relative_to(self.root).as_posix()
+        self.notebooks[rel] = {
+            "seconds": round(seconds, 3),
+            "cells": {str(i): {"before": cell_hash(before[i]), "code": code}
+                      for i, code in sorted(patched.items())},
+        }
+
+    def save(self, path: Path) -> None:
+        data = {"schema": SHARD_SCHEMA, "shard": str(self.shard) if self.shard else None,
+                "root": str(self.root), "stages": self.stages, "notebooks": self.notebooks}
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(Path(path), json.dumps(data, indent=1, ensure_ascii=False) + "\n")
+
+
+class MergeReport(NamedTuple):
+    modified: List[str]                   # notebooks réécrits
+    conflicts: List[Tuple[str, int]]      # (notebook, cellule) modifiée ailleurs
+    timings: Dict[str, float]
+    stages: Dict[str, int]
+
+
+def merge_results(root: Path, part_paths: Iterable[Path]) -> MergeReport:
+    """Applique les résultats partiels de tous les shards au dépôt `root`.
+
+    Une cellule n'est remplacée que si sa source actuelle est celle que le
+    shard a vue (ou déjà la version corrigée) ; sinon c'est un conflit et
+    la cellule est laissée telle quelle.
+    """
+    root = Path(root).resolve()
+    wanted: Dict[str, Dict[int, Dict]] = {}
+    timings: Dict[str, float] = {}
+    stages: Dict[str, int] = {}
+    seen_shards = set()
+    for part in part_paths:
+        data = json.loads(Path(part).read_text(encoding="utf-8"))
+        if data.get("schema") != SHARD_SCHEMA:
+            raise ValueError(f"{part} : schéma de résultat partiel inconnu")
+        if data.get("shard") in seen_shards:
+            raise ValueError(f"{part} : shard {data['shard']} fourni deux fois")
+        seen_shards.add(data.get("shard"))
+        for stage, n in data.get("stages", {}).items():
+            stages[stage] = stages.get(stage, 0) + n
+        for rel, entry in data["notebooks"].items():
+            timings[rel] = entry["seconds"]
+            if entry["cells"]:
+                wanted.setdefault(rel, {}).update(
+                    {int(i): cell for i, cell in entry["cells"].items()})
+
+    modified, conflicts = [], []
+    for rel in sorted(wanted):
+        nb_path = root / rel
+        if not nb_path.exists():
+            conflicts.extend((rel, i) for i in sorted(wanted[rel]))
+            continue
+        current = {cell.index: cell.source for cell in read_code_cells(nb_path)}
+        patches = {}
+        for index, cell in sorted(wanted[rel].items()):
+            src = current.get(index)
+            if src == cell["code"]:
+                continue  # déjà appliqué (checkout du shard lui-même)
+            if src is None or cell_hash(src) != cell["before"]:
+                conflicts.append((rel, index))
+                continue
+            patches[index] = cell["code"]
+        if patches:
+            patch_cell_sources(nb_path, patches)
+            modified.append(rel)
+    return MergeReport(modified, conflicts, timings, stages)
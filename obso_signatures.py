@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# obso_signatures.py – signatures de dépréciation apprises à l'exécution
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from obso_cache import CACHE_DIR
+from obso_nbio import atomic_write
+
+# ---------------------------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------------------------
+
+# Base partagée : écrite par l'agent dynamique, lue par l'agent statique
+# (chaîne vide = désactivée)
+SIGNATURES_PATH = os.getenv("OBSO_SIGNATURES", str(CACHE_DIR / "signatures.json"))
+SIGNATURE_MIN_COUNT = int(os.getenv("OBSO_SIGNATURE_MIN_COUNT", "1"))  # observations requises
+
+SIGNATURES_SCHEMA = 1
+
+_CALL_RE = re.compile(r"(\.)?\b([A-Za-z_]\w*)\s*\(")
+_ATTR_RE = re.compile(r"\.([A-Za-z_]\w*)\b")
+_KWARG_RE = re.compile(r"\b([A-Za-z_]\w*)\s*=(?!=)")
+# Le message vise un argument, pas l'appel lui-même : « 'method' », « numeric_only »,
+# « pass `include_groups=False` », « The 'sep' keyword »…
+_ARGUMENT_HINT_RE = re.compile(
+    r"\b(?:keyword|argument|parameter|default value)s?\b|\w=|['`\"][A-Za-z_]\w*['`\"](?!\()",
+    re.I)
+# Noms trop courants pour servir de règle, même s'ils apparaissent dans un message
+_GENERIC = {"print", "len", "str", "int", "float", "list", "dict", "set", "tuple", "range",
+            "type", "object", "self", "data", "value", "values", "name", "index", "use",
+            "get", "warn", "to", "of", "in", "is", "and", "or", "not"}
+
+
+def _mentions(message: str, name: str) -> bool:
+    return re.search(rf"(?<![\w]){re.escape(name)}(?![\w])", message) is not None
+
+
+def _call_args(line: str, start: int) -> str:
+    """Texte des arguments de l'appel ouvert juste avant `start` (jusqu'à sa « ) »)."""
+    depth = 1
+    for i in range(start, len(line)):
+        if line[i] in "([{":
+            depth += 1
+        elif line[i] in ")]}":
+            depth -= 1
+            if depth == 0:
+                return line[start:i]
+    return line[start:]
+
+
+def signature_of(line: str, message: str) -> Optional[Tuple[str, str]]:
+    """(regex, API) de l'appel de `line` que nomme le message du warning.
+
+    Appels d'abord (`.ravel(` → `\\.ravel\\(`), puis accès d'attribut
+    (`.ix[` → `\\.ix\\b`). Si le message vise un argument
+    (`fillna(method=…)`, `delim_whitespace`…), la règle exige ce mot-clé
+    dans l'appel (`\\.fillna\\([^)]*\\bmethod\\b`) ; s'il n'est pas sur la
+    ligne (valeur par défaut, argument à ajouter), rien n'est appris :
+    le nom seul de la méthode signalerait tous ses appels. None aussi si
+    aucun nom de la ligne n'est cité dans le message.
+    """
+    for m in _CALL_RE.finditer(line):
+        dot, name = m.group(1), m.group(2)
+        if len(name) > 2 and name not in _GENERIC and _mentions(message, name):
+            prefix = r"\." if dot else r"\b"
+            call, api = prefix + re.escape(name) + r"\(", ("." if dot else "") + name + "("
+            for kw in _KWARG_RE.findall(_call_args(line, m.end())):
+                if _mentions(message, kw):
+                    return call + r"[^)]*\b" + re.escape(kw) + r"\b", api + kw + "="
+            if _ARGUMENT_HINT_RE.search(message):
+                return None
+            return call, api
+    for m in _ATTR_RE.finditer(line):
+        name = m.group(1)
+        if len(name) > 1 and name not in _GENERIC and _mentions(message, name):
+            return r"\." + re.escape(name) + r"\b", "." + name
+    return None
+
+
+# ---------------------------------------------------------------------------
+# BASE
+# ---------------------------------------------------------------------------
+
+class SignatureDB:
+    """Signatures indexées par regex.
+
+    Format JSON : {schema, signatures: {regex: {api, category, message,
+    example, count, notebooks, first_seen, last_seen}}}.
+    """
+
+    def __init__(self, path: Optional[str] = SIGNATURES_PATH):
+        self.path = Path(path) if path else None
+        self.signatures: Dict[str, Dict] = {}
+        self.added = 0
+        self._load()
+
+    def _load(self) -> None:
+        if self.path is None:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("schema") == SIGNATURES_SCHEMA:
+            self.signatures = data.get("signatures", {})
+
+    def observe(self, category: str, message: str, source: str, line: Optional[int],
+                notebook: str) -> Optional[str]:
+        """Enregistre un warning observé dans `source` ; renvoie la regex apprise."""
+        if not line:
+            return None
+        lines = source.split("\n")
+        if not 1 <= line <= len(lines):
+            return None
+        found = signature_of(lines[line - 1], message)
+        if found is None:
+            return None
+        pattern, api = found
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        entry = self.signatures.get(pattern)
+        if entry is None:
+            self.added += 1
+            entry = self.signatures[pattern] = {
+                "api": api, "category": category, "message": message,
+                "example": lines[line - 1].strip(), "count": 0, "notebooks": [],
+                "first_seen": now}
+        entry["count"] += 1
+        entry["last_seen"] = now
+        if notebook not in entry["notebooks"]:
+            entry["notebooks"] = (entry["notebooks"] + [notebook])[-20:]
+        return pattern
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"schema": SIGNATURES_SCHEMA, "signatures": self.signatures}
+        atomic_write(self.path, json.dumps(data, indent=1, sort_keys=True, ensure_ascii=False) + "\n")
+
+    def rules(self, min_count: int = SIGNATURE_MIN_COUNT) -> Dict[str, str]:
+        """Règles pour le scan statique : regex → consigne (le message du warning).
+
+        Une entrée que signature_of n'apprendrait plus telle quelle (base
+        écrite par une version antérieure) est ignorée.
+        """
+        out = {}
+        for pattern, entry in sorted(self.signatures.items()):
+            if entry.get("count", 0) < min_count:
+                continue
+            learned = signature_of(entry.get("example", ""), entry.get("message", ""))
+            if learned is None or learned[0] != pattern:
+                continue
+            try:
+                re.compile(pattern)
+            except re.error:
+                continue  # base éditée à la main
+            out[pattern] = f"{entry['category']}: {entry['message']}"
+        return out
+
+
+def learned_rules(path: Optional[str] = SIGNATURES_PATH,
+                  min_count: int = SIGNATURE_MIN_COUNT) -> Dict[str, str]:
+    return SignatureDB(path).rules(min_count)
+
+
+def merge_rules(base: Dict[str, str], learned: Dict[str, str]) -> Dict[str, str]:
+    """Table écrite à la main d'abord ; les signatures apprises n'en écrasent aucune."""
+    merged = dict(base)
+    for pattern, suggestion in learned.items():
+        merged.setdefault(pattern, suggestion)
+    return merged
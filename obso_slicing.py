@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# obso_slicing.py – extraction des seules instructions fautives d'une cellule
+
+from __future__ import annotations
+
+import ast
+import os
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+# Au-delà de cette part des lignes de la cellule, on envoie la cellule entière
+SLICE_MAX_RATIO = float(os.getenv("SLICE_MAX_RATIO", "0.6"))
+
+_BODIES = ("body", "orelse", "finalbody", "handlers", "cases")
+
+
+class Slice(NamedTuple):
+    start: int     # première ligne (0-based) de la zone dans la cellule
+    end: int       # ligne de fin exclue
+    indent: str    # indentation retirée puis remise au collage
+    code: str      # instructions désindentées, envoyées au LLM
+
+
+def lines_of_spans(src: str, spans: Iterable[Tuple[int, int]]) -> Set[int]:
+    """Numéros de ligne (1-based) couverts par des positions (début, fin) de `src`."""
+    lines: Set[int] = set()
+    for start, end in spans:
+        first = src.count("\n", 0, start) + 1
+        lines.update(range(first, src.count("\n", 0, max(start, end - 1)) + 2))
+    return lines
+
+
+def _indent_of(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _start_line(node: ast.stmt) -> int:
+    decorators = getattr(node, "decorator_list", None)
+    return min([node.lineno] + [d.lineno for d in decorators]) if decorators else node.lineno
+
+
+def _children(node: ast.AST) -> List[ast.stmt]:
+    out: List[ast.stmt] = []
+    for field in _BODIES:
+        for child in getattr(node, field, None) or []:
+            if isinstance(child, ast.stmt):
+                out.append(child)
+            else:  # except/case : on descend dans leur corps
+                out.extend(c for c in getattr(child, "body", []) if isinstance(c, ast.stmt))
+    return out
+
+
+def _innermost(stmts: Sequence[ast.stmt], line: int, lines: List[str]) -> Optional[ast.stmt]:
+    for node in stmts:
+        if not (_start_line(node) <= line <= node.end_lineno):
+            continue
+        inner = _innermost(_children(node), line, lines)
+        # l'instruction doit ouvrir sa ligne (sinon `if x: y = ...` : on garde le parent)
+        if inner is not None and lines[inner.lineno - 1][:inner.col_offset].strip() == "":
+            return inner
+        return node
+    return None
+
+
+def slice_statements(src: str, target_lines: Iterable[int],
+                     max_ratio: float = SLICE_MAX_RATIO) -> Optional[List[Slice]]:
+    """Zones de lignes couvrant les instructions qui contiennent `target_lines`.
+
+    Renvoie None s'il vaut mieux envoyer la cellule entière : code non
+    parsable, aucune instruction trouvée, zones trop grandes, ou indentation
+    impossible à retirer sans toucher à une chaîne multi-lignes.
+    """
+    try:
+        tree = ast.parse(src)
+    except SyntaxError:
+        return None
+    lines = src.split("\n")
+    ranges: List[Tuple[int, int]] = []
+    for line in sorted(set(target_lines)):
+        node = _innermost(tree.body, line, lines)
+        if node is None:
+            continue
+        ranges.append((_start_line(node) - 1, node.end_lineno))
+    if not ranges:
+        return None
+
+    merged: List[List[int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    if sum(end - start for start, end in merged) > max_ratio * len(lines):
+        return None
+
+    slices = []
+    for start, end in merged:
+        block = lines[start:end]
+        indent = _indent_of(block[0])
+        if indent and ('"""' in "".join(block) or "'''" in "".join(block)):
+            return None
+        if any(l.strip() and not l.startswith(indent) for l in block):
+            return None
+        slices.append(Slice(start, end, indent, "\n".join(l[len(indent):] for l in block)))
+    return slices
+
+
+def splice(src: str, slices: Sequence[Slice], replacements: Sequence[str]) -> str:
+    """Remplace chaque zone par son code corrigé, réindenté."""
+    lines = src.split("\n")
+    for sl, new in sorted(zip(slices, replacements), key=lambda p: p[0].start, reverse=True):
+        new_lines = [sl.indent + l if l.strip() else l for l in new.strip("\n").split("\n")]
+        lines[sl.start:sl.end] = new_lines
+    return "\n".join(lines)
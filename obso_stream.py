@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# obso_stream.py – réponses LLM lues en flux : budget de sortie et arrêt anticipé
+
+from __future__ import annotations
+
+import ast
+import keyword
+import os
+import re
+from typing import Optional, Set
+
+from obso_client import StreamAborted
+
+# ---------------------------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------------------------
+
+LLM_STREAM = os.getenv("LLM_STREAM", "1") != "0"  # lire les réponses en flux
+# max_tokens = tokens estimés de l'entrée × ratio (plancher MIN) : limite dure côté serveur
+LLM_MAX_TOKENS_RATIO = float(os.getenv("LLM_MAX_TOKENS_RATIO", "3"))
+LLM_MAX_TOKENS_MIN = int(os.getenv("LLM_MAX_TOKENS_MIN", "64"))
+# Côté client, plus strict : caractères reçus ≤ entrée × GROWTH + SLACK
+STREAM_MAX_GROWTH = float(os.getenv("STREAM_MAX_GROWTH", "1.5"))
+STREAM_SLACK_CHARS = int(os.getenv("STREAM_SLACK_CHARS", "160"))
+# Lignes absentes de l'entrée tolérées (au moins autant que l'entrée en compte)
+STREAM_MIN_NOVEL_LINES = int(os.getenv("STREAM_MIN_NOVEL_LINES", "4"))
+
+# Annotation de type : str, pd.Series, Optional[int], int | None
+_ANNOTATION = r"[\w.]+(?:\[[\w.\[\], |]*\])?(?:\s*\|\s*[\w.]+(?:\[[\w.\[\], |]*\])?)*"
+# Début de réponse en langage naturel (« Sure! Here is… », « The corrected code: »).
+# « note: » / « explanation: » suivis d'une annotation puis de « = » ou de la
+# fin du texte reçu sont du code (note: str = "…"), pas de la prose.
+_PROSE_RE = re.compile(
+    r"(?:(?:sure|certainly|of course)[!,.]|here(?:'s| is| are)\b|below (?:is|are)\b"
+    r"|the (?:corrected|fixed|updated|modified)\b|i(?:'ve| have)? (?:replaced|updated|fixed|changed)\b"
+    r"|this (?:code|snippet|version)\b"
+    rf"|(?:note|explanation):(?!\s*{_ANNOTATION}\s*(?:=|$)))", re.I)
+# Phrase : au moins quatre mots, sans ponctuation propre au code
+_SENTENCE_RE = re.compile(r"[A-Za-z][\w']*(?:,? [\w']+){3,}[.:!]?")
+_CODE_CHARS = set("()[]{}=#\"'`")
+
+
+def max_tokens_for(text: str) -> int:
+    """Plafond de tokens de sortie pour une réponse qui réécrit `text`."""
+    return max(LLM_MAX_TOKENS_MIN, int((len(text) // 4 + 1) * LLM_MAX_TOKENS_RATIO))
+
+
+def truncated(resp, max_tokens: Optional[int] = None) -> bool:
+    """True si le serveur a coupé la réponse au plafond `max_tokens`.
+
+    En flux, langchain_mistralai ne transmet pas finish_reason : on compare
+    alors les tokens de sortie (usage_metadata, dernier morceau) au plafond.
+    """
+    meta = getattr(resp, "response_metadata", None) or {}
+    if meta.get("finish_reason") == "length":
+        return True
+    usage = getattr(resp, "usage_metadata", None) or {}
+    return max_tokens is not None and usage.get("output_tokens", 0) >= max_tokens
+
+
+def _norm(line: str) -> str:
+    return " ".join(line.split())
+
+
+def _is_sentence(line: str) -> bool:
+    """Ligne en langage naturel : « Replace the deprecated call. »"""
+    if not _SENTENCE_RE.fullmatch(line) or _CODE_CHARS & set(line):
+        return False
+    if keyword.iskeyword(line.split()[0]):  # for x in rows: / import numpy as np
+        return False
+    try:
+        ast.parse(line)
+    except SyntaxError:
+        return True
+    return False
+
+
+class CodeGuard:
+    """Surveille une réponse « code seul » qui remplace `source`, au fil du flux.
+
+    `check` lève StreamAborted dès que la réponse contient une fence
+    markdown, commence par de la prose, ou s'éloigne manifestement de
+    l'entrée : trop longue, ou trop de lignes qui n'y figurent pas (cellule
+    réécrite, notebook entier…). Une telle réponse serait rejetée par la
+    validation ou ne serait pas une correction ciblée : inutile d'en
+    attendre la fin.
+    """
+
+    def __init__(self, source: str):
+        lines = source.split("\n")
+        self.limit = int(len(source) * STREAM_MAX_GROWTH) + STREAM_SLACK_CHARS
+        self.known: Set[str] = {_norm(line) for line in lines}
+        self.novel_limit = max(STREAM_MIN_NOVEL_LINES, len(lines))
+        self.checked = 0   # lignes complètes déjà examinées
+        self.novel = 0
+        self.first = True  # première ligne non vide pas encore examinée
+
+    def check(self, text: str) -> None:
+        if "```" in text:
+            raise StreamAborted("fence", text)
+        if len(text) > self.limit:
+            raise StreamAborted("diverged", text)
+        head = text.lstrip()
+        if self.first and _PROSE_RE.match(head):
+            raise StreamAborted("prose", text)
+        complete = text.split("\n")[:-1]
+        for line in complete[self.checked:]:
+            if self.first and line.strip():
+                self.first = False
+                if _is_sentence(line.strip()):
+                    raise StreamAborted("prose", text)
+            if _norm(line) not in self.known:
+                self.novel += 1
+        self.checked = len(complete)
+        if self.novel > self.novel_limit:
+            raise StreamAborted("diverged", text)
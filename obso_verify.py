@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# obso_verify.py – vérification des corrections par ré-exécution d'une tranche de notebook
+
+from __future__ import annotations
+
+import ast
+import builtins
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import nbformat
+
+from obso_kernel import collect, instrument
+
+_BUILTINS = set(dir(builtins))
+
+
+# ---------------------------------------------------------------------------
+# GRAPHE DÉFINITIONS / UTILISATIONS
+# ---------------------------------------------------------------------------
+
+class CellDeps(NamedTuple):
+    defs: Set[str]      # noms liés par la cellule
+    mutates: Set[str]   # noms peut-être modifiés en place (df["a"] = …, lst.append(…))
+    imports: Set[str]   # noms liés par un import
+    uses: Set[str]      # noms lus (hors builtins)
+    opaque: bool        # cellule non analysable (magics…) : gardée par prudence
+
+
+def _base_name(node: ast.AST) -> Optional[str]:
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+class _DefUse(ast.NodeVisitor):
+    def __init__(self):
+        self.defs: Set[str] = set()
+        self.mutates: Set[str] = set()
+        self.imports: Set[str] = set()
+        self.uses: Set[str] = set()
+
+    def visit_Name(self, node: ast.Name) -> None:
+        (self.uses if isinstance(node.ctx, ast.Load) else self.defs).add(node.id)
+
+    def _store_target(self, node: ast.AST) -> None:
+        # df["a"] = … / df.x = … : modifie df, qui est donc aussi lu
+        base = _base_name(node)
+        if base and not isinstance(node, ast.Name):
+            self.mutates.add(base)
+            self.uses.add(base)
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        for target in node.targets:
+            self._store_target(target)
+        self.generic_visit(node)
+
+    def visit_AugAssign(self, node: ast.AugAssign) -> None:
+        self._store_target(node.target)
+        base = _base_name(node.target)
+        if base:
+            self.uses.add(base)
+        self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call) -> None:
+        # méthode appelée sur un nom (df.drop(..., inplace=True), lst.append) :
+        # mutation possible
+        if isinstance(node.func, ast.Attribute):
+            base = _base_name(node.func.value)
+            if base:
+                self.mutates.add(base)
+        self.generic_visit(node)
+
+    def _bind(self, name: str) -> None:
+        self.defs.add(name)
+
+    def visit_FunctionDef(self, node) -> None:
+        self._bind(node.name)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_ClassDef = visit_FunctionDef
+
+    def visit_Import(self, node) -> None:
+        for alias in node.names:
+            name = (alias.asname or alias.name).split(".")[0]
+            self._bind(name)
+            self.imports.add(name)
+
+    visit_ImportFrom = visit_Import
+
+
+def cell_deps(src: str) -> CellDeps:
+    try:
+        tree = ast.parse(src)
+    except SyntaxError:
+        return CellDeps(set(), set(), set(), set(), True)
+    visitor = _DefUse()
+    visitor.visit(tree)
+    return CellDeps(visitor.defs, visitor.mutates, visitor.imports,
+                    visitor.uses - _BUILTINS, False)
+
+
+def dependency_slice(cells: Sequence[Tuple[int, str]], targets: Iterable[int]) -> List[int]:
+    """Index des cellules à exécuter pour rejouer `targets` : elles et leurs amonts.
+
+    On remonte les cellules de la dernière cible vers le début : une cellule
+    est gardée si elle définit un nom encore attendu, ses propres lectures
+    s'ajoutent alors aux noms attendus. Les cellules opaques sont gardées.
+    Un appel de méthode sur un module importé (pd.read_csv) ne compte pas
+    comme une modification du module.
+    """
+    targets = set(targets)
+    deps = {index: cell_deps(src) for index, src in cells}
+    modules = set().union(*(d.imports for d in deps.values()))
+    needed: Set[str] = set()
+    keep: List[int] = []
+    last = max(targets) if targets else -1
+    for index, _ in reversed(cells):
+        if index > last:
+            continue
+        d = deps[index]
+        if index in targets or d.opaque or (d.defs | (d.mutates - modules)) & needed:
+            keep.append(index)
+            needed |= d.uses
+    return sorted(keep)
+
+
+# ---------------------------------------------------------------------------
+# VÉRIFICATION
+# ---------------------------------------------------------------------------
+
+class Verdict(NamedTuple):
+    accepted: bool
+    reason: str
+
+
+def _run_slice(metadata, sources: Dict[int, str], order: List[int],
+               run: Callable[[nbformat.NotebookNode], None]):
+    """Exécute les cellules `order` ; renvoie (messages de warning, erreurs) par index d'origine."""
+    nb = nbformat.v4.new_notebook(metadata=metadata)
+    nb.cells = [nbformat.v4.new_code_cell(sources[i]) for i in order]
+    nb = instrument(nb)
+    run(nb)
+    warned: Dict[int, Set[str]] = {}
+    for w in collect(nb):
+        warned.setdefault(order[w.cell], set()).add(w.message)
+    errors: Dict[int, str] = {}
+    for pos, cell in enumerate(nb.cells[1:]):
+        for out in cell.get("outputs", []):
+            if out.get("output_type") == "error":
+                errors[order[pos]] = f"{out.get('ename')}: {out.get('evalue')}"
+    return warned, errors
+
+
+def verify_fixes(metadata, sources: Dict[int, str], patched: Dict[int, str],
+                 targeted: Dict[int, Set[str]],
+                 run: Callable[[nbformat.NotebookNode], None]) -> Dict[int, Verdict]:
+    """Rejoue les cellules corrigées et leurs dépendances, puis juge chaque correction.
+
+    Acceptée si aucun des warnings visés ne réapparaît dans la cellule et si
+    elle ne lève pas d'exception. Si la cellule corrigée échoue, la même
+    tranche est rejouée avec le code d'origine : une erreur déjà présente
+    (dépendance hors tranche, fichier absent…) laisse la correction sans
+    verdict d'exécution, elle est alors gardée.
+    """
+    fixed = {**sources, **patched}
+    order = dependency_slice(sorted(fixed.items()), patched)
+    warned, errors = _run_slice(metadata, fixed, order, run)
+
+    verdicts: Dict[int, Verdict] = {}
+    failing = []
+    for index in patched:
+        still = warned.get(index, set()) & targeted.get(index, set())
+        if index in errors:
+            failing.append(index)
+        elif still:
+            verdicts[index] = Verdict(False, f"warning still raised: {sorted(still)[0][:60]}")
+        else:
+            verdicts[index] = Verdict(True, "warning gone")
+    if failing:
+        _, before = _run_slice(metadata, sources, order, run)
+        for index in failing:
+            if index in before and not warned.get(index, set()) & targeted.get(index, set()):
+                verdicts[index] = Verdict(True, "unverified: cell fails without the fix too")
+            elif index in before:
+                verdicts[index] = Verdict(False, "warning still raised")
+            else:
+                verdicts[index] = Verdict(False, f"new exception: {errors[index][:60]}")
+    return verdicts
@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import agent_obsolescence as agent
+from obso_cache import FixCache
+from obso_client import CircuitOpenError, StreamAborted
+
+CELLS = ["x = s.ravel()", "y = t.ravel()"]
+MAPPING = {"ravel": "to_numpy"}
+
+
+@pytest.fixture
+def batch(monkeypatch, tmp_path):
+    monkeypatch.setattr(agent, "CACHE", FixCache(tmp_path))
+    direct = []
+
+    async def afix(snippet, mapping, lookup=True):
+        assert not lookup  # le cache a déjà été consulté par BatchProposer.propose
+        direct.append(snippet)
+        return snippet.replace("ravel", "to_numpy")
+
+    monkeypatch.setattr(agent, "afix_code_snippet", afix)
+
+    def run(reply):
+        async def ainvoke(system, human, source=None):
+            if isinstance(reply, Exception):
+                raise reply
+            return SimpleNamespace(content=reply)
+
+        monkeypatch.setattr(agent, "_ainvoke", ainvoke)
+
+        async def go():
+            proposer = agent.BatchProposer(asyncio.Semaphore(2), budget_tokens=10_000)
+            return await asyncio.gather(*(proposer.propose(c, MAPPING) for c in CELLS),
+                                        return_exceptions=True)
+
+        return asyncio.run(go())
+
+    return run, direct
+
+
+@pytest.mark.parametrize("reply", ["not json {", '["x = 1"]',
+                                   StreamAborted("truncated", '{"c0": "x = s.to_')])
+def test_unusable_batch_reply_falls_back_to_one_request_per_cell(batch, reply):
+    run, direct = batch
+    assert run(reply) == ["x = s.to_numpy()", "y = t.to_numpy()"]
+    assert sorted(direct) == sorted(CELLS)
+
+
+def test_llm_unavailable_is_propagated(batch):
+    run, direct = batch
+    results = run(CircuitOpenError("LLM indisponible"))
+    assert all(isinstance(r, CircuitOpenError) for r in results)
+    assert direct == []
+
+
+def test_invalid_llm_answer_is_not_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(agent, "CACHE", FixCache(tmp_path))
+    replies = iter(["x = s.to_numpy(", "x = s.to_numpy()"])
+
+    async def ainvoke(system, human, source=None):
+        return SimpleNamespace(content=next(replies))
+
+    monkeypatch.setattr(agent, "_ainvoke", ainvoke)
+    assert asyncio.run(agent.afix_code_snippet(CELLS[0], MAPPING)) == "x = s.to_numpy("
+    assert agent.CACHE.get(agent._cache_key(CELLS[0], MAPPING)) is None
+    assert asyncio.run(agent.afix_code_snippet(CELLS[0], MAPPING)) == "x = s.to_numpy()"
+    assert agent.CACHE.get(agent._cache_key(CELLS[0], MAPPING)) == "x = s.to_numpy()"
+
+
+def test_batch_cache_miss_is_counted_once(monkeypatch, tmp_path):
+    monkeypatch.setattr(agent, "CACHE", FixCache(tmp_path))
+
+    async def ainvoke(system, human, source=None):
+        return SimpleNamespace(content="x = s.to_numpy()")
+
+    monkeypatch.setattr(agent, "_ainvoke", ainvoke)
+
+    async def go():
+        proposer = agent.BatchProposer(asyncio.Semaphore(2), budget_tokens=10_000)
+        return await proposer.propose(CELLS[0], MAPPING)
+
+    assert asyncio.run(go()) == "x = s.to_numpy()"
+    assert (agent.CACHE.hits, agent.CACHE.misses) == (0, 1)
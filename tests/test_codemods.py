@@ -0,0 +1,131 @@
+import pytest
+
+from obso_codemods import apply_codemods, run_codemods, strip_comments
+
+
+# -- .ravel() ----------------------------------------------------------------
+
+def test_ravel_on_pandas_series_is_rewritten():
+    src = "s = pd.Series([1, 2])\nx = s.ravel()"
+    assert apply_codemods(src) == "s = pd.Series([1, 2])\nx = s.to_numpy()"
+
+
+def test_ravel_on_pandas_column_is_rewritten():
+    src = "df = pd.read_csv('a.csv')\nx = df['a'].ravel()"
+    assert apply_codemods(src) == "df = pd.read_csv('a.csv')\nx = df['a'].to_numpy()"
+
+
+@pytest.mark.parametrize("src", [
+    "x = np.arange(4).ravel()",
+    "x = df.values.ravel()",
+    "x = df.to_numpy().ravel()",
+])
+def test_ravel_on_ndarray_is_left_alone(src):
+    result = run_codemods(src)
+    assert result.code == src
+    assert result.sites["ravel"] == 1
+
+
+@pytest.mark.parametrize("src", [
+    "fig, axes = plt.subplots(2, 2)\nfor ax in axes.ravel():\n    ax.plot([1])",
+    "x = s.ravel()",                      # s vient d'une autre cellule
+    "s = pd.Series([1])\nx = s.ravel('F')",
+    "s = pd.Series([1])\ns = load()\nx = s.ravel()",
+])
+def test_ravel_on_unknown_receiver_goes_to_llm(src):
+    assert apply_codemods(src) is None
+
+
+# -- .format() ---------------------------------------------------------------
+
+def test_index_format_is_rewritten():
+    src = "idx = pd.Index(['a'])\nlabels = idx.format()"
+    assert apply_codemods(src) == "idx = pd.Index(['a'])\nlabels = idx.astype(str).tolist()"
+
+
+@pytest.mark.parametrize("src", [
+    "msg = '{} rows'.format(n)",
+    "template = 'x={}'\nmsg = template.format()",
+    "msg = template.format(n)",
+    "msg = template.format(value=3)",
+])
+def test_str_format_is_a_false_positive(src):
+    result = run_codemods(src)
+    assert result.code == src
+    assert result.sites["format"] == 1
+
+
+@pytest.mark.parametrize("src", [
+    "labels = template.format()",
+    "idx = pd.Index(['a'])\nlabels = idx.format(name=True)",
+])
+def test_ambiguous_format_goes_to_llm(src):
+    assert apply_codemods(src) is None
+
+
+# -- .ix / freq ----------------------------------------------------------------
+
+def test_ix_with_labels_and_integers():
+    assert apply_codemods("a = df.ix['x', 'col']") == "a = df.loc['x', 'col']"
+    assert apply_codemods("a = df.ix[:, :]") == "a = df.iloc[:, :]"
+    # .ix[0] était une recherche par label sur un index entier : au LLM
+    assert apply_codemods("a = df.ix[0, 1]") is None
+    assert apply_codemods("a = df.ix[0]") is None
+    assert apply_codemods("a = df.ix[0:3]") is None
+
+
+def test_freq_q_is_rewritten():
+    src = "r = pd.date_range('2020', periods=4, freq='Q')"
+    assert apply_codemods(src) == "r = pd.date_range('2020', periods=4, freq='QE')"
+
+
+@pytest.mark.parametrize("src", [
+    "r = df.resample(freq='Q').sum()",
+    "g = df.groupby(pd.Grouper(key='d', freq='Q'))",
+    "r = s.asfreq(freq='Q')",
+])
+def test_freq_q_is_rewritten_for_offset_consumers(src):
+    assert apply_codemods(src) == src.replace("'Q'", "'QE'")
+
+
+@pytest.mark.parametrize("src", [
+    "p = pd.period_range('2020', periods=4, freq='Q')",
+    "p = pd.Period('2020-01', freq='Q')",
+    "p = s.to_period(freq='Q')",
+])
+def test_period_freq_q_is_left_alone(src):
+    result = run_codemods(src)
+    assert result.code == src and result.sites["freq"] == 1
+
+
+def test_freq_q_on_unknown_call_goes_to_llm():
+    assert apply_codemods("x = make_calendar(freq='Q')") is None
+
+
+def test_lowercase_freq_is_not_counted_as_handled():
+    result = run_codemods("r = pd.date_range('2020', periods=4, freq='q')")
+    assert result.sites["freq"] == 0
+
+
+def test_strip_comments():
+    assert strip_comments("x = 1  # s.ravel()\n# idx.format()") == "x = 1  \n"
+
+
+# -- escalade vers le LLM (agent_obsolescence.try_codemods) --------------------
+
+def _try(src):
+    import agent_obsolescence as agent
+    return agent.try_codemods(src, agent.MATCHER.rules_hit(src))
+
+
+def test_unhandled_match_escalates_to_llm():
+    assert _try("r = pd.date_range('2020', periods=4, freq='q')") is None
+
+
+def test_false_positives_stay_with_codemod():
+    src = "msg = '{} rows'.format(n)  # old: s.ravel()"
+    assert _try(src) == src
+
+
+def test_rewrite_is_kept():
+    assert _try("r = pd.date_range('2020', freq='Q')") == "r = pd.date_range('2020', freq='QE')"
@@ -0,0 +1,61 @@
+import subprocess
+
+from obso_manifest import Manifest
+
+
+def _git(root, *args):
+    subprocess.run(["git", "-C", str(root), *args], check=True, capture_output=True)
+
+
+def _repo(tmp_path):
+    root = tmp_path / "repo"
+    root.mkdir()
+    _git(root, "init", "-q")
+    _git(root, "config", "user.email", "ci@example.com")
+    _git(root, "config", "user.name", "ci")
+    for name in ("a.ipynb", "b.ipynb"):
+        (root / name).write_text("{}", encoding="utf-8")
+    _git(root, "add", ".")
+    _git(root, "commit", "-q", "-m", "init")
+    head = subprocess.run(["git", "-C", str(root), "rev-parse", "HEAD"],
+                          capture_output=True, text=True, check=True).stdout.strip()
+    return root.resolve(), head
+
+
+def test_llm_failures_are_retried_in_incremental_mode(tmp_path):
+    root, head = _repo(tmp_path)
+    path = tmp_path / "manifest.json"
+    manifest = Manifest(path, root, "v1")
+    manifest.record(root / "a.ipynb", ["x = 1"], retry=True)
+    manifest.record(root / "b.ipynb", ["y = 2"])
+    manifest.save(head)
+
+    reloaded = Manifest(path, root, "v1")
+    assert reloaded.pending_retry() == ["a.ipynb"]
+    assert reloaded.changed_notebooks() == [root / "a.ipynb"]
+
+    reloaded.record(root / "a.ipynb", ["x = 1", "s.ravel()"])
+    reloaded.save(head)
+    assert Manifest(path, root, "v1").changed_notebooks() == []
+
+
+def test_patched_notebook_is_retried_until_the_fix_lands(tmp_path):
+    root, head = _repo(tmp_path)
+    path = tmp_path / "manifest.json"
+    manifest = Manifest(path, root, "v1")
+    nb = root / "a.ipynb"
+    nb.write_text('{"patched": 1}', encoding="utf-8")  # correction écrite par le run
+    manifest.record(nb, ["x = s.to_numpy()"], patched=True)
+    manifest.record(root / "b.ipynb", ["y = 2"])
+    manifest.save(head)
+
+    # run suivant sur la branche par défaut : la PR du bot n'est pas fusionnée
+    _git(root, "checkout", "-q", "--", "a.ipynb")
+    reloaded = Manifest(path, root, "v1")
+    assert reloaded.changed_notebooks() == [nb]
+
+    # la correction a atterri : le notebook n'est plus repris
+    nb.write_text('{"patched": 1}', encoding="utf-8")
+    _git(root, "commit", "-qam", "merge bot fix")
+    assert reloaded.changed_notebooks() == []
+    assert "patched" not in reloaded.notebooks["a.ipynb"]
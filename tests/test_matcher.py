@@ -0,0 +1,26 @@
+import re
+
+from obso_matcher import RuleMatcher, required_literal
+
+RULES = {r"\.format\(": "a", r"DataFrame\.ix": "b", r"\.ravel\(": "c", r"freq=[\"']Q[\"']": "d"}
+
+
+def test_required_literal():
+    assert required_literal(r"\.ravel\(") == ".ravel("
+    assert required_literal(r"\.read_csv\([^)]*\bdelim_whitespace\b") == "delim_whitespace"
+    assert required_literal(r"(foo)bar") == "foobar"
+    assert required_literal(r"ravel|format") == ""
+
+
+def test_scan_matches_single_alternation():
+    src = "x = s.RAVEL()\nr = pd.date_range('2020', freq='q')\n'{}'.format(1)  # df.ravel()"
+    combined = re.compile("|".join(f"({rule})" for rule in RULES), re.IGNORECASE)
+    matches = RuleMatcher(RULES).scan(src)
+    assert [(m.start, m.end) for m in matches] == [m.span() for m in combined.finditer(src)]
+    assert [m.rule for m in matches] == [r"\.ravel\(", r"freq=[\"']Q[\"']", r"\.format\(", r"\.ravel\("]
+
+
+def test_rules_without_literal_are_always_tried():
+    matcher = RuleMatcher({r"ravel|format": "x"})
+    assert matcher.rules_hit("s.format()") == {r"ravel|format": "x"}
+    assert matcher.search("nothing here") is None
@@ -0,0 +1,45 @@
+import re
+
+from obso_signatures import SignatureDB, signature_of
+
+RAVEL = ("Series.ravel is deprecated. The underlying array is already 1D, so ravel is not "
+         "necessary.  Use `to_numpy()` for conversion to a numpy array instead.")
+NUMERIC_ONLY = ("The default value of numeric_only in DataFrameGroupBy.mean is deprecated. In a "
+                "future version, numeric_only will default to False. Either specify "
+                "numeric_only or select only columns which should be valid for the function.")
+FILLNA = ("DataFrame.fillna with 'method' is deprecated and will raise in a future version. "
+          "Use obj.ffill() or obj.bfill() instead.")
+DELIM = ("The 'delim_whitespace' keyword in pd.read_csv is deprecated and will be removed in a "
+         "future version. Use ``sep='\\s+'`` instead")
+APPLY = ("DataFrameGroupBy.apply operated on the grouping columns. This behavior is deprecated, "
+         "and in a future version of pandas the grouping columns will be excluded from the "
+         "operation. Either pass `include_groups=False` to exclude the groupings or explicitly "
+         "select the grouping columns after groupby to silence this warning.")
+
+
+def test_call_level_deprecation_learns_the_method():
+    assert signature_of("x = s.ravel()", RAVEL) == (r"\.ravel\(", ".ravel(")
+
+
+def test_keyword_on_the_line_is_part_of_the_rule():
+    pattern, _ = signature_of("df = pd.read_csv(path, delim_whitespace=True)", DELIM)
+    assert pattern == r"\.read_csv\([^)]*\bdelim_whitespace\b"
+    assert re.search(pattern, "pd.read_csv('a.csv', delim_whitespace=True)")
+    assert not re.search(pattern, "pd.read_csv('a.csv', sep=',')")
+    pattern, _ = signature_of("df = df.fillna(method='ffill')", FILLNA)
+    assert pattern == r"\.fillna\([^)]*\bmethod\b"
+
+
+def test_argument_level_deprecation_without_keyword_learns_nothing():
+    assert signature_of("m = df.groupby('k').mean()", NUMERIC_ONLY) is None
+    assert signature_of("r = df.groupby('k').apply(f)", APPLY) is None
+    assert signature_of("df = pd.read_csv(path)", DELIM) is None
+
+
+def test_stale_bare_name_entries_are_not_served_as_rules(tmp_path):
+    db = SignatureDB(str(tmp_path / "sig.json"))
+    db.observe("FutureWarning", FILLNA, "df = df.fillna(method='ffill')", 1, "nb.ipynb")
+    db.signatures[r"\.mean\("] = {"api": ".mean(", "category": "FutureWarning",
+                                  "message": NUMERIC_ONLY, "example": "df.groupby('k').mean()",
+                                  "count": 3, "notebooks": []}
+    assert list(db.rules()) == [r"\.fillna\([^)]*\bmethod\b"]
@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+import pytest
+
+from obso_client import StreamAborted
+from obso_stream import CodeGuard, truncated
+
+
+def test_truncated_from_finish_reason_or_streamed_usage():
+    assert truncated(SimpleNamespace(response_metadata={"finish_reason": "length"}))
+    # réponse en flux : pas de finish_reason, seulement les tokens de sortie
+    streamed = SimpleNamespace(response_metadata={}, usage_metadata={"output_tokens": 64})
+    assert truncated(streamed, max_tokens=64)
+    assert not truncated(streamed, max_tokens=65)
+    assert not truncated(streamed)
+
+
+def test_annotated_assignment_is_not_prose():
+    src = 'note: str = "x"\nnotes = s.ravel()'
+    guard = CodeGuard(src)
+    guard.check('note: str = "x"\nnotes = s.to_numpy()\n')
+
+
+@pytest.mark.parametrize("reply", ["Note: the deprecated call was replaced.\n",
+                                   "Explanation:\nravel is deprecated.\n"])
+def test_prose_notes_are_aborted(reply):
+    with pytest.raises(StreamAborted):
+        CodeGuard("x = s.ravel()").check(reply)
+
+
+@pytest.mark.parametrize("partial", ["note: str", 'note: Optional[str] = "x', "explanation: int | None = 1"])
+def test_partial_annotation_is_not_prose(partial):
+    CodeGuard("x = s.ravel()").check(partial)